@@ -0,0 +1,93 @@
+"""
+A set of answer ids backed by a packed bit array.
+
+The bits live in a single Python int: bit i is set iff answer i is in the set.
+Intersection is a single `&` and the size is a popcount, so none of the set operations used by the
+tree search allocate a Python object per answer.
+"""
+
+from typing import Iterable, Iterator
+
+import numpy as np
+
+
+class AnswerSet:
+    __slots__ = ("bits",)
+
+    def __init__(self, bits: int = 0):
+        self.bits = bits
+
+    @staticmethod
+    def from_ids(ids: np.ndarray) -> "AnswerSet":
+        """Create a set from an array of answer ids"""
+        ids = np.asarray(ids)
+        if ids.size == 0:
+            return AnswerSet(0)
+        mask = np.zeros(int(ids.max()) + 1, dtype=bool)
+        mask[ids] = True
+        packed = np.packbits(mask, bitorder="little")
+        return AnswerSet(int.from_bytes(packed.tobytes(), "little"))
+
+    @staticmethod
+    def from_iterable(ids: Iterable[int]) -> "AnswerSet":
+        bits = 0
+        for i in ids:
+            bits |= 1 << int(i)
+        return AnswerSet(bits)
+
+    @staticmethod
+    def full(num_answers: int) -> "AnswerSet":
+        """The set containing every answer id in range(num_answers)"""
+        return AnswerSet((1 << num_answers) - 1)
+
+    def to_array(self) -> np.ndarray:
+        """Return the answer ids in the set as a sorted array"""
+        if self.bits == 0:
+            return np.empty(0, dtype=np.int64)
+        packed = np.frombuffer(
+            self.bits.to_bytes((self.bits.bit_length() + 7) // 8, "little"),
+            dtype=np.uint8,
+        )
+        return np.flatnonzero(np.unpackbits(packed, bitorder="little"))
+
+    def first(self) -> int:
+        """Return the smallest answer id in the set"""
+        assert self.bits != 0
+        return (self.bits & -self.bits).bit_length() - 1
+
+    def add(self, answer: int) -> None:
+        self.bits |= 1 << int(answer)
+
+    def update(self, other: "AnswerSet") -> None:
+        self.bits |= other.bits
+
+    def intersection(self, other: "AnswerSet") -> "AnswerSet":
+        return AnswerSet(self.bits & other.bits)
+
+    def __and__(self, other: "AnswerSet") -> "AnswerSet":
+        return AnswerSet(self.bits & other.bits)
+
+    def __or__(self, other: "AnswerSet") -> "AnswerSet":
+        return AnswerSet(self.bits | other.bits)
+
+    def __contains__(self, answer: int) -> bool:
+        return (self.bits >> int(answer)) & 1 == 1
+
+    def __len__(self) -> int:
+        # (int.bit_count needs Python 3.10)
+        return bin(self.bits).count("1")
+
+    def __bool__(self) -> bool:
+        return self.bits != 0
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.to_array().tolist())
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, AnswerSet) and self.bits == other.bits
+
+    def __hash__(self) -> int:
+        return hash(self.bits)
+
+    def __repr__(self) -> str:
+        return f"AnswerSet({self.to_array().tolist()})"
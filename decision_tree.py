@@ -1,25 +1,33 @@
+import functools
 import json
 import logging
+import multiprocessing
+import multiprocessing.pool
 import os.path
-import pickle
 import time
 import itertools
-from typing import Dict, Iterable, List, Set, Tuple, Optional
+from typing import Dict, Iterable, Iterator, List, Set, Tuple, Optional
 
 import coloredlogs
 import numpy as np
 import pandas as pd
 from tqdm import tqdm
 
-from parse_data import read_all_answers, read_parsed_words
+from parse_data import read_all_answers
+from answer_set import AnswerSet
+from hard_mode import HardModeFilter
+from partition_index import PartitionIndex, load_dictionary_partition_index
+from partition_scores import PartitionScores, score_guesses
 from play import LETTER_ABSENT, RIGHT_PLACE, WRONG_PLACE
 from possibilities_table import (
-    TABLE_PATH,
-    TABLE_PATH_ASYMMETRIC,
-    TABLE_PATH_CHEATING,
     integer_to_arr,
     guess_response_to_string,
+    letter_array_to_masks,
+    load_possibilities,
+    words_to_letter_array,
 )
+from transposition_table import TranspositionTable
+from tree_checkpoint import TreeCheckpoint, get_tree_file_hash
 
 
 ALL_LETTERS_CORRECT = (3 ** 5) - 1
@@ -48,9 +56,8 @@ TQDM_DEPTH = 1
 OPT_3_LOG_LEVEL = logging.DEBUG
 
 # whether to use optimization #4
-# doesn't always make sense to turn this on
-# if we use a smaller dictionary, the solver is much faster without it
 # this makes the solver use a better heuristic at shallower depths to better direct the search
+# now that the partition scores are vectorized, this is cheap enough to leave on for every dictionary
 USE_OPT_4 = True
 # at what level to output these messages
 # note that logging.DEBUG will *hide* the messages. This is on purpose.
@@ -61,13 +68,9 @@ IS_TIMING_ENABLED = False
 # at what depth to time
 TIMING_DEPTH = 2
 
-SORTED_GUESSES = []  # type: List[int]
-GUESS_WORDS = []  # type: List[str]
-ANSWER_WORDS = []  # type: List[str]
-
-# every time we have a solution for a subtree at depth n, save the entire tree
+# every time we solve the subtree for a result of the first word, save it so that the search can be resumed (--resume)
+# off by default. Turned on with --checkpoint (or --resume)
 USE_CHECKPOINTS = False
-CHECKPOINT_DEPTH = 2
 
 # if we don't care about optimality and want to just find some decision tree
 # then we can just exit when we find a solution
@@ -77,6 +80,13 @@ EXIT_ON_FIRST_SOLUTION = True
 # we generally want to leave this off
 DEBUG_HEURISTIC = False
 
+# how many (guess, result) pairs to remember the absent letters for
+ABSENT_LETTERS_CACHE_SIZE = 65536
+
+# whether to remember the subtrees found for each set of answers at each depth, and reuse them when another path gets there
+# only applies outside of hard mode, and when optimization #4 is on
+USE_TRANSPOSITION_TABLE = True
+
 # if we're improving a tree, then can exit on first improvement
 # this is just meant as a debug option.
 # we don't really want this
@@ -88,7 +98,12 @@ EXIT_ON_FIRST_IMPROVEMENT_LOG_LEVEL = logging.WARNING
 # we only use it when optimizing an existing tree
 # it allows us to only check the top n next guesses for a guess result
 # set this to -1 to disable this optimization
-OPTIMIZE_MAX_GUESSES_PER_RESULT = 10
+# with the branch and bound lower bounds we can afford to check every guess (-1), at least on the answers dictionary
+OPTIMIZE_MAX_GUESSES_PER_RESULT = -1
+# how often (in seconds) the anytime search (--time-budget) writes out the best tree so far
+ANYTIME_WRITE_INTERVAL = 60
+# the most time (in seconds) the anytime search spends on one partition before moving on to the partitions below it
+ANYTIME_PARTITION_TIME_LIMIT = 300
 # whether to print the previous work at this depth if a tree is given
 # logging.DEBUG will make sure it's not printed
 PREV_TREE_LOG_LEVEL = logging.DEBUG
@@ -105,7 +120,7 @@ def get_black_letters(
     Once a letter is turned black from a guess, that letter cannot be used in any subsequent word.
     Return all the unusable letters
     NOTE: This is the only method that relies on words being strings rather than integers
-    NOTE: This method is on the hot path so long as pick_next_guesses_it is on the hot path
+    NOTE: The search uses the letter masks in SearchContext instead, see SearchContext.get_absent_letters
     """
     black_letters = set([])
     for (guess, result) in zip(guesses, results):
@@ -135,17 +150,16 @@ def get_human_readable_path(
 
 
 def get_chain(
-    prev_guesses: List[int], prev_guess_results: List[int], depth: int
+    prev_guesses: List[int], prev_guess_results: List[int], depth: int, guess_words: List[str]
 ) -> str:
     """
     Used for debugging.
     Print the entire chain of the decision tree so far.
-    NOTE: accesses GUESS_WORDS in global scope
     """
     chain = []
     for i in range(depth):
         guess = prev_guesses[i]
-        guess_word = GUESS_WORDS[guess]
+        guess_word = guess_words[guess]
         chain.append(guess_word)
         if i < len(prev_guess_results):
             rv = prev_guess_results[i]
@@ -155,13 +169,13 @@ def get_chain(
 
 
 def print_chain(
-    prev_guesses: List[int], prev_guess_results: List[int], depth: int
+    prev_guesses: List[int], prev_guess_results: List[int], depth: int, guess_words: List[str]
 ) -> None:
     """
     Used for debugging.
     Print the entire chain of the decision tree so far.
     """
-    s = get_chain(prev_guesses, prev_guess_results, depth)
+    s = get_chain(prev_guesses, prev_guess_results, depth, guess_words)
     print(s)
 
 
@@ -175,22 +189,56 @@ def get_worst_partition_bincount(row: np.ndarray) -> float:
     return np.bincount(row).max()
 
 
-def get_mean_partition_arr(table: np.ndarray, possible_answers: Set[int]) -> np.ndarray:
-    # select the columns of the table with the possible answers
-    possible_answers_arr = np.array(list(possible_answers))
-    m = table[:, possible_answers_arr]
-    # compute the mean partition size for each row
-    return np.apply_along_axis(get_mean_partition, axis=1, arr=m)
+def get_answers_arr(possible_answers: Iterable[int]) -> np.ndarray:
+    """Return the possible answers as an array of answer ids"""
+    if isinstance(possible_answers, AnswerSet):
+        return possible_answers.to_array()
+    return np.array(list(possible_answers))
+
+
+def get_mean_partition_arr(table: np.ndarray, possible_answers: AnswerSet) -> np.ndarray:
+    # compute the mean partition size for each row, restricted to the columns of the possible answers
+    return score_guesses(table, get_answers_arr(possible_answers)).mean_partition
 
 
 def get_worst_partition_arr(
-    table: np.ndarray, possible_answers: Set[int]
+    table: np.ndarray, possible_answers: AnswerSet, guess_ids: Optional[np.ndarray] = None
 ) -> np.ndarray:
-    # select the columns of the table with the possible answers
-    possible_answers_arr = np.array(list(possible_answers))
-    m = table[:, possible_answers_arr]
-    # compute the mean partition size for each row
-    return np.apply_along_axis(get_worst_partition_bincount, axis=1, arr=m)
+    # compute the worst partition size for each row (or just guess_ids), restricted to the columns of the possible answers
+    return score_guesses(table, get_answers_arr(possible_answers), guess_ids).worst_partition
+
+
+def get_min_tree_sizes(max_answers: int, depth: int, max_partitions: int = ALL_LETTERS_CORRECT) -> np.ndarray:
+    """
+    Return an admissible lower bound on the size of a subtree which finds n answers, for every n up to max_answers.
+    The first guess of the subtree is made at depth + 1
+    Each guess finds at most one answer, and splits the others into at most max_partitions partitions
+    So at most 1 answer is found at depth + 1, max_partitions at depth + 2, max_partitions ** 2 at depth + 3 and so on
+    """
+    sizes = np.zeros(max_answers + 1, dtype=np.int64)
+    remaining = np.arange(max_answers + 1)
+    num_nodes = 1
+    level = depth + 1
+    while remaining.any():
+        found = np.minimum(remaining, num_nodes)
+        sizes += found * level
+        remaining -= found
+        num_nodes *= max(max_partitions, 2)
+        level += 1
+    return sizes
+
+
+def get_min_guess_tree_sizes(hist: np.ndarray, depth: int) -> np.ndarray:
+    """
+    Return an admissible lower bound on the size of the subtree for each guess, if it is the next guess (at depth + 1)
+    :param hist:    The (num_guesses, 243) histogram of partition sizes of the possible answers for each guess
+    """
+    # no guess splits any subset of these answers into more partitions than the best guess splits all of them
+    max_partitions = int(np.count_nonzero(hist, axis=1).max())
+    min_sizes = get_min_tree_sizes(int(hist.max()), depth + 1, max_partitions)
+    is_answer = hist[:, ALL_LETTERS_CORRECT]
+    # each partition is a subtree starting at depth + 2, except that the guess itself (if it's an answer) is found at depth + 1
+    return min_sizes[hist].sum(axis=1) - min_sizes[is_answer] + is_answer * (depth + 1)
 
 
 def compute_letter_scores(guesses: list[int], guess_results: list[int], guess_words: list[str]) -> Dict[str, int]:
@@ -243,20 +291,21 @@ def NEW_pick_next_guesses_it(
     guesses: List[int],
     guess_results: List[int],
     table: np.ndarray,
-    possible_answers: Set[int],
+    possible_answers: AnswerSet,
+    allowed: Optional[np.ndarray] = None,
+    scores: Optional[PartitionScores] = None,
 ) -> Iterable[int]:
     """Return an iterator over possible next guesses in order of our heuristic
-    This method is about 40 times slower than `pick_next_guesses_it`
-    Hopefully it returns values that are 40x better
+    This used to be about 40 times slower than `pick_next_guesses_it`, before the partition scores were vectorized
+    :param allowed: If provided, only return guesses where this bool array is true (hard mode)
+    :param scores:  The scores of every guess against possible_answers, if they have already been computed
     """
-    possible_answers_arr = np.array(list(possible_answers))
-    # select the columns of the table with the possible answers
-    m = table[:, possible_answers_arr]
-
-    # compute the largest partition size for each row
-    # sort_arr = np.apply_along_axis(get_worst_partition_bincount, axis=1, arr=m)
     # compute the mean partition size for each row
-    sort_arr = np.apply_along_axis(get_mean_partition, axis=1, arr=m)
+    # the other scores (e.g. worst_partition) come out of the same pass
+    if scores is None:
+        sort_arr = get_mean_partition_arr(table, possible_answers)
+    else:
+        sort_arr = scores.mean_partition
 
     si = np.argsort(sort_arr)
 
@@ -266,6 +315,8 @@ def NEW_pick_next_guesses_it(
     # use si to sort the valid guesses in order of the heuristic
     # smallest mean partition goes first
     sg = np.take_along_axis(valid_guesses, si, axis=0)
+    if allowed is not None:
+        sg = sg[allowed[sg]]
 
     for next_guess in sg:
         if next_guess in guesses:
@@ -277,31 +328,34 @@ def NEW_pick_next_guesses_it(
 
 def pick_next_guesses_it(
     guesses: List[int],
-    guess_results: List[int],
-    sorted_guesses: List[int],
-    guess_words: List[str],
-) -> Iterable[int]:
-    """Return an iterator over possible next guesses.
+    excluded_letters: int,
+    sorted_guesses: np.ndarray,
+    sorted_guess_masks: np.ndarray,
+    sorted_guess_ranks: np.ndarray,
+    allowed: Optional[np.ndarray] = None,
+    exit_on_first_solution: bool = True,
+) -> np.ndarray:
+    """Return an array of possible next guesses.
     They are returned in the order that they are probably best.
     Guesses that contain known non-existant letters are not returned.
+    :param excluded_letters: The letters which are known to be absent, as a 26-bit mask
+    :param sorted_guess_masks: The letter mask for each guess in sorted_guesses
+    :param sorted_guess_ranks: The position of each guess word in sorted_guesses
+    :param allowed: If provided, only return guesses where this bool array is true (hard mode)
+    :param exit_on_first_solution: Whether the search only wants *a* solution. Must be true, see below
 
     NOTE: This is on the hot path. This method will be called hundreds of thousands, if not millions, of times.
     NOTE: This method is unsound - it may not return some valid guesses, leading to suboptimal results
     """
-    if not EXIT_ON_FIRST_SOLUTION:
+    if not exit_on_first_solution:
         raise Exception("Error: Using unsound method pick_next_guesses_it when trying to find optimal solution")
 
-    black_letters = get_black_letters(guesses, guess_results, guess_words)
-
-    for next_guess in sorted_guesses:
-        if next_guess in guesses:
-            continue
-
-        w = guess_words[next_guess]
-        if any([letter in black_letters for letter in w]):
-            continue
-
-        yield next_guess
+    keep = (sorted_guess_masks & excluded_letters) == 0
+    if allowed is not None:
+        keep &= allowed[sorted_guesses]
+    # don't guess the same word twice
+    keep[sorted_guess_ranks[guesses]] = False
+    return sorted_guesses[keep]
 
 
 def NEW_find_possible_answers(
@@ -330,21 +384,28 @@ def NEW_find_possible_answers(
 
 
 def find_possible_answers(
-    guesses: List[int], guess_results: List[int], table: np.ndarray
-) -> Set[int]:
+    guesses: List[int],
+    guess_results: List[int],
+    table: np.ndarray,
+    index: Optional[PartitionIndex] = None,
+) -> AnswerSet:
     """
-    Return a list of answers that are still possible given this history
+    Return a set of answers that are still possible given this history
     I benchmarked this and it's pretty fast
+    :param index:   If provided, look up the answers for each guess in the partition index instead of scanning the table
     """
     assert len(guesses) == len(guess_results)
 
     # to start, we can reach all words
-    reachable = set(np.arange(table.shape[0]))
+    reachable = AnswerSet.full(table.shape[1])
     for i, guess in enumerate(guesses):
         result = guess_results[i]
-        reachable_from_guess = set(np.where(table[guess] == result)[0])
+        if index is None:
+            reachable_from_guess = AnswerSet.from_ids(np.where(table[guess] == result)[0])
+        else:
+            reachable_from_guess = index.get_answer_set(guess, result)
         # print("Can reach %d answers from guess %d" % (len(reachable_from_guess), guess))
-        reachable.intersection_update(reachable_from_guess)
+        reachable = reachable & reachable_from_guess
     # print("Can reach %d answers total" % len(reachable))
     return reachable
 
@@ -359,46 +420,93 @@ def print_chain_debug(*args) -> None:
         print_chain(*args)
 
 
-def checkpoint_tree(
-    guesses: List[int],
-    guess_results: List[int],
-    depth: int,
-    tree: dict,
-    guess_words: List[str],
-    table: np.ndarray,
-) -> None:
-    human_readable_path = get_human_readable_path(
-        guesses, guess_results, depth, guess_words
-    )
-
-    # figure out the dictionary used
-    assert guesses != []
-
-    dictionary = "answers"
-    if table.shape == (12972, 12972):
-        dictionary = "full"
-    elif table.shape == (12972, 2315):
-        dictionary = "asymmetric"
-    else:
-        dictionary = "answers"
+class SearchContext:
+    """
+    Everything the search needs other than the path it is on: the table, the words, the heuristic ordering and the options.
+    Each search gets its own context, so searches with different settings can run side by side (or in a pool)
+    The defaults for the options are the module-level constants
+    """
 
-    path = (
-        f"cache/tree-checkpoints/checkpoint-{dictionary}-{human_readable_path}.pickle"
-    )
-    with open(path, "wb") as fp:
-        pickle.dump(tree, fp)
-    logging.info("Checkpointed partially solved tree")
+    def __init__(
+        self,
+        table: np.ndarray,
+        guess_words: List[str],
+        answer_words: List[str],
+        sorted_guesses: np.ndarray,
+        index: Optional[PartitionIndex] = None,
+        hard_mode_filter: Optional[HardModeFilter] = None,
+        transpositions: Optional[TranspositionTable] = None,
+        content_hash: Optional[str] = None,
+        max_depth: int = MAX_DEPTH,
+        exit_on_first_solution: bool = EXIT_ON_FIRST_SOLUTION,
+        use_opt_4: bool = USE_OPT_4,
+        progress_log_level: int = PROGRESS_LOG_LEVEL,
+        use_tqdm_low_depths: bool = USE_TQDM_LOW_DEPTHS,
+        is_timing_enabled: bool = IS_TIMING_ENABLED,
+        use_checkpoints: bool = USE_CHECKPOINTS,
+    ):
+        """
+        :param sorted_guesses:      Guess word indexes in the order the (cheap) heuristic should try them
+        :param index:               The partition index for the table. If not provided we scan the table rows instead
+        :param hard_mode_filter:    If provided, restricts the guesses at every node to those that use all the hints so far
+        :param transpositions:      If provided, reuse the subtrees found for the same answers at the same depth.
+                                    Only valid if the guesses we try don't depend on the path, so not in hard mode
+                                    or with the black-letter heuristic (without optimization #4)
+        :param content_hash:        Hash of the table file, if known. Used to key anything saved to disk
+        """
+        self.table = table
+        self.guess_words = guess_words
+        self.answer_words = answer_words
+        self.sorted_guesses = sorted_guesses
+        # the letters in each guess word as a 26-bit mask, in the same order as sorted_guesses
+        # so that filtering out the guesses with known absent letters is a single vectorized test
+        self.letters = words_to_letter_array(guess_words)
+        self.sorted_guess_masks = letter_array_to_masks(self.letters)[sorted_guesses]
+        # sorted_guess_ranks[i] is the position of guess word i in sorted_guesses
+        self.sorted_guess_ranks = np.empty(len(sorted_guesses), dtype=np.int64)
+        self.sorted_guess_ranks[sorted_guesses] = np.arange(len(sorted_guesses))
+        self.get_absent_letters = functools.lru_cache(maxsize=ABSENT_LETTERS_CACHE_SIZE)(
+            self._get_absent_letters
+        )
+        self.index = index
+        self.hard_mode_filter = hard_mode_filter
+        self.transpositions = transpositions
+        self.content_hash = content_hash
+        self.max_depth = max_depth
+        self.exit_on_first_solution = exit_on_first_solution
+        self.use_opt_4 = use_opt_4
+        self.progress_log_level = progress_log_level
+        self.use_tqdm_low_depths = use_tqdm_low_depths
+        self.is_timing_enabled = is_timing_enabled
+        self.use_checkpoints = use_checkpoints
+        # if set, the time (as returned by time.time) at which the search stops trying new guesses
+        # and returns the best subtrees it has found so far
+        self.deadline = None  # type: Optional[float]
+
+    def is_out_of_time(self) -> bool:
+        return self.deadline is not None and time.time() > self.deadline
+
+    def _get_absent_letters(self, guess: int, result: int) -> int:
+        """Return the letters which are absent after guessing `guess` and getting `result`, as a 26-bit mask"""
+        mask = 0
+        for letter, val in zip(self.letters[guess], integer_to_arr(result)):
+            if val == LETTER_ABSENT:
+                mask |= 1 << int(letter)
+        return mask
 
 
 def construct_tree(
     guesses: List[int],
     guess_results: List[int],
-    table: np.ndarray,
     depth: int,
-    possible_answers: Set[int],
+    possible_answers: AnswerSet,
+    ctx: SearchContext,
     size_cutoff: int = -1,
     tree: Optional[Dict[int, dict]] = None,
-) -> Tuple[dict, Set[int], int, int]:
+    pool: Optional[multiprocessing.pool.Pool] = None,
+    excluded_letters: int = 0,
+    checkpoint: Optional[TreeCheckpoint] = None,
+) -> Tuple[dict, AnswerSet, int, int]:
     """
     Try to construct the best tree starting from an initial guess.
     *best* is defined here as a tree that reaches the maximum number of possible answers
@@ -407,9 +515,17 @@ def construct_tree(
     :param guess_results:       The results of the those guesses, in order. Will be one fewer than guesses
     :param depth:               The depth of the tree. Should be the same as # of guesses
     :param possible_answers:    The set of possible answers remaining
+    :param ctx:                 The table, words and options for this search
     :param size_cutoff:         If the size of the current tree is greater than *or equal to* the size_cutoff, then return early.
                                 -1 for no size cutoff
     :param tree:                A previously constructed tree for this guess
+    :param pool:                If provided (and there is no size cutoff), solve the partitions for each result of this guess in the pool.
+                                The workers must have been started by make_search_pool, with the same settings as ctx.
+                                Only meant for the root: the subtrees below are searched sequentially in each worker
+    :param excluded_letters:    The letters which the guesses so far showed to be absent, as a 26-bit mask
+    :param checkpoint:          If provided (and there is no size cutoff), save each partition to it once it's solved,
+                                and take the partitions it already has from it rather than solving them again.
+                                Only meant for the root
 
     Return a tuple of 3 items:
         - tree ->               Map from a root word to possible results for that root word. Each action maps to another guess and so forth
@@ -439,7 +555,7 @@ def construct_tree(
         action_map = tree[latest_guess]
         has_prev_tree = True
 
-    tree_found_words = set([])
+    tree_found_words = AnswerSet()
     num_states_opened = 1  # we tried the root
     tree_size = 0
 
@@ -449,293 +565,113 @@ def construct_tree(
         tree_found_words.add(latest_guess)
         tree_size += depth
 
-    if depth >= MAX_DEPTH:
+    if depth >= ctx.max_depth:
         return tree, tree_found_words, tree_size, num_states_opened
 
     if size_cutoff > -1 and tree_size >= size_cutoff:
         return tree, tree_found_words, tree_size, num_states_opened
 
     # don't enumerate guess results if this is the last possible guess anyway
-    if len(possible_answers) == 1 and list(possible_answers)[0] == latest_guess:
+    if len(possible_answers) == 1 and possible_answers.first() == latest_guess:
         return tree, tree_found_words, tree_size, num_states_opened
 
-    # NOTE: this may look at partitions that don't actually exist
-    possible_results, counts = np.unique(table[latest_guess], return_counts=True)
-    # a further optimization: we should try the partitions with the *most* possible answers *first*
-    si = np.argsort(-1 * counts)
-    possible_results = np.take_along_axis(possible_results, si, axis=0)
-
-    if USE_TQDM_LOW_DEPTHS and depth == TQDM_DEPTH:
-        pr_it = tqdm(possible_results)
-    else:
-        pr_it = possible_results
-
-    if IS_TIMING_ENABLED and TIMING_DEPTH == depth:
+    possible_results = get_possible_results(latest_guess, ctx)
+    partitions = iter_partitions(latest_guess, possible_results, possible_answers, ctx)  # type: Iterable[Tuple[int, AnswerSet]]
+    num_partitions = len(possible_results)
+
+    # branch and bound: a lower bound on the total size of the partitions we haven't solved yet
+    # each partition only gets the budget left over once the others have been given their lower bound
+    min_size_left = 0
+    if size_cutoff > -1:
+        partition_sizes = np.bincount(ctx.table[latest_guess, get_answers_arr(possible_answers)], minlength=ALL_LETTERS_CORRECT + 1)
+        partition_sizes[ALL_LETTERS_CORRECT] = 0
+        min_partition_tree_sizes = get_min_tree_sizes(int(partition_sizes.max()), depth)
+        min_size_left = int(min_partition_tree_sizes[partition_sizes].sum())
+        if tree_size + min_size_left >= size_cutoff:
+            return tree, tree_found_words, tree_size, num_states_opened
+
+    # without a size cutoff the partitions don't share a budget, so they are independent and can be solved side by side
+    assert checkpoint is None or size_cutoff == -1
+    pool_results = None  # type: Optional[Iterator[PartitionResult]]
+    if pool is not None and size_cutoff == -1:
+        partitions = list(partitions)
+        num_partitions = len(partitions)
+        tasks = [
+            (guesses, guess_results, guess_result, new_possible_answers, depth, action_map.get(guess_result) if has_prev_tree else None, excluded_letters)
+            for guess_result, new_possible_answers in partitions
+            if checkpoint is None or checkpoint.get(guess_result) is None
+        ]
+        # the partitions are sorted largest first, so hand them out one at a time to keep every worker busy
+        # imap (rather than imap_unordered) means we assemble the tree in the same order as the sequential search
+        pool_results = pool.imap(_solve_partition_in_worker, tasks, chunksize=1)
+
+    if ctx.use_tqdm_low_depths and depth == TQDM_DEPTH:
+        partitions = tqdm(partitions, total=num_partitions)
+
+    if ctx.is_timing_enabled and TIMING_DEPTH == depth:
         start = time.time()
 
     is_early_exit = False
-    for guess_result in pr_it:
-        if guess_result == ALL_LETTERS_CORRECT and latest_guess in possible_answers:
-            # we've guessed the word. we're good.
-            # no need to add it to the decision tree
-            # tree_found_words.add(latest_guess)
-            assert latest_guess in tree_found_words
-            continue
-        elif (
-            guess_result == ALL_LETTERS_CORRECT and latest_guess not in possible_answers
-        ):
-            # logging.warning("We should not be looking here")
-            continue
-
-        possible_answers_for_result = np.where(table[latest_guess] == guess_result)[0]
-        possible_answers_for_result_s = set(possible_answers_for_result)
-        new_possible_answers = possible_answers.intersection(
-            possible_answers_for_result_s
-        )
-
-        if not new_possible_answers:
-            # this is a combo of guesses that simply doesn't yield any valid words remaining
-            # so there's no need to add it to the decision tree
-            continue
-
-        if has_prev_tree and guess_result != ALL_LETTERS_CORRECT:
-            assert guess_result in action_map, f"Guess result must exist in action map {guess_result}"
-
-        # TODO: uses globals and violates scope
-        next_guesses_it = pick_next_guesses_it(
-            guesses, guess_results + [guess_result], SORTED_GUESSES, GUESS_WORDS
-        )
-
-        # has to be -1 to match size_cutoff argument
-        best_subtree_size = -1
-        if size_cutoff > -1:
-            # we only have the budget of whatever is remaining from our top-level cutoff
-            best_subtree_size = size_cutoff - tree_size
-            # logging.warning("Changed best_subtree_size to %d", best_subtree_size)
-        best_subtree_found_words = set([])
-
-        # number of guesses tried to find the optimal subtree
-        # keep track of this for DEBUG_HEURISTIC
-        num_guesses_tried = 0
-
-        # true iff we found a guess that solves this subtree (works with this guess result)
-        is_subtree_solved = False
-
-        is_opt_4_enabled = False
-
-        if len(new_possible_answers) == 1:
-            # Optimization #1: if there is only one possible answer, then we guess only that answer
-            # then we guess that word
-            answer = list(new_possible_answers)[0]
-            next_guesses_it = [answer]
-            # logging.info("Applying optimization #1 at depth %d", depth)
-        elif depth == (MAX_DEPTH - 1) and len(new_possible_answers) > 1:
-            # Optimization #2: if we have 1 guess remaining and there are many (>1) possible words
-            # then we can just guess any of those words
-            # it doesn't matter, we will only be able to reach one of them anyway
-            # save time on not trying more possibilities
-            logging.debug("Applying optimization #2 at depth 5 - early exit")
-            is_early_exit = True
-            break
-        elif depth == (MAX_DEPTH - 2):
-            # Optimization #3: we have only 2 guesses left
-            # we need to pick the guess that divides the space such that, for all possible remaining answers, we can solve the puzzle using the last guess
-            # i.e. we want all partitions to have size 1
-            worst_partition_arr = get_worst_partition_arr(table, new_possible_answers)
-            # is there any guess that has a worst partition of 1?
-            good_guesses = np.where(worst_partition_arr == 1)[0]
-            if good_guesses.size == 0:
-                logging.log(
-                    OPT_3_LOG_LEVEL,
-                    "Optimization #3 enabled: there is *no* good partition at depth 4. Exiting early.",
-                )
-                is_early_exit = True
-                break
-            else:
-                # this is our optimal partition
-                opt = int(good_guesses[0])
-                next_guesses_it = [opt]
-                logging.log(
-                    OPT_3_LOG_LEVEL,
-                    "Optimization #3 enabled: Found the optimal partition at depth 4",
-                )
-        elif USE_OPT_4 and depth <= (MAX_DEPTH - 3):
-            # Optimization #4
-            # instead of using our weak heuristic, use a slower but better heuristic to select guesses
-            logging.log(OPT_4_LOG_LEVEL, "Optimization #4 enabled at depth %d", depth)
-            next_guesses_it = NEW_pick_next_guesses_it(
-                guesses, guess_results, table, new_possible_answers
-            )
-            is_opt_4_enabled = True
-
-        # if we have a previous tree, we may try the same next_guess for a given guess_result more than once
-        # this will prevent us from doing that
-        visited = set([])  # type: Set[int]
-        prev_tree_guess = -1
-
+    for guess_result, new_possible_answers in partitions:
         if has_prev_tree:
-            # the action map is a mapping from guess_result (converted to string) to dictionary
-            # the dictionary will be rooted at a single key (string)
-            # that key will correspond to an integer
-            prev_tree_guess = list(action_map[guess_result].keys())[0]
-            logging.log(
-                PREV_TREE_LOG_LEVEL,
-                "%s[d=%d] Previous guess at this spot was %s",
-                '\t' * depth, depth, GUESS_WORDS[prev_tree_guess]
-            )
-            # add our guess to the front of those that we try
-            next_guesses_it = itertools.chain([prev_tree_guess], next_guesses_it)
-
-        for ngi, next_guess in enumerate(next_guesses_it):
-            if next_guess in visited:
-                continue
-            if not EXIT_ON_FIRST_SOLUTION and OPTIMIZE_MAX_GUESSES_PER_RESULT > -1 and ngi >= OPTIMIZE_MAX_GUESSES_PER_RESULT:
-                if depth <= 1:
-                    logging.warning("[d=%d] Reached max # of guesses (%d) for guess result %s. Not looking for better guesses.",
-                                    depth, OPTIMIZE_MAX_GUESSES_PER_RESULT, guess_response_to_string(guess_result))
-                break
-
-            # ---- this is all debug code
-            if USE_OPT_4 and is_opt_4_enabled:
-                logging.log(
-                    OPT_4_LOG_LEVEL,
-                    "[d=%d] Optimization #4 enabled. Trying guess %d instead for guess_result %d",
-                    depth,
-                    next_guess,
-                    guess_result,
-                )
-            # ---- this is all debug code
-
-            subtree = None  # type: Optional[dict]
-            if has_prev_tree:
-                if prev_tree_guess == next_guess:
-                    subtree = action_map[guess_result]
+            assert guess_result in action_map, f"Guess result must exist in action map {guess_result}"
 
-            subtree, subtree_found_words, subtree_size, subtree_states_opened = construct_tree(
-                guesses=guesses + [next_guess],
-                guess_results=guess_results + [guess_result],
-                table=table,
+        checkpointed = checkpoint.get(guess_result) if checkpoint is not None else None
+        if checkpointed is not None:
+            # solved by a previous run
+            subtree, subtree_size = checkpointed
+            partition_result = (subtree, new_possible_answers, subtree_size, 0, True, False)  # type: PartitionResult
+        elif pool_results is not None:
+            partition_result = next(pool_results)
+        else:
+            # has to be -1 to match size_cutoff argument
+            partition_size_cutoff = -1
+            if size_cutoff > -1:
+                # we only have the budget of whatever is remaining from our top-level cutoff
+                min_size_left -= int(min_partition_tree_sizes[len(new_possible_answers)])
+                partition_size_cutoff = size_cutoff - tree_size - min_size_left
+            partition_result = solve_partition(
+                guesses=guesses,
+                guess_results=guess_results,
+                guess_result=guess_result,
                 possible_answers=new_possible_answers,
-                depth=depth + 1,
-                size_cutoff=best_subtree_size,
-                tree=subtree,
+                depth=depth,
+                ctx=ctx,
+                size_cutoff=partition_size_cutoff,
+                tree=action_map[guess_result] if has_prev_tree else None,
+                excluded_letters=excluded_letters,
             )
+        best_subtree, best_subtree_found_words, best_subtree_size, subtree_states_opened, is_subtree_solved, is_dead_end = partition_result
+        num_states_opened += subtree_states_opened
 
-            num_states_opened += subtree_states_opened
-            num_guesses_tried += 1
-
-            if len(subtree_found_words) == len(new_possible_answers):
-                if best_subtree_size == -1 or subtree_size < best_subtree_size:
-                    # need to convert numpy type into python-native type for later serialization
-                    action_map[int(guess_result)] = subtree
-                    is_improvement = (best_subtree_size > -1) and not (has_prev_tree and latest_guess == prev_tree_guess)
-                    prev_best_subtree_size = best_subtree_size
-                    # update best subtree size
-                    best_subtree_found_words = subtree_found_words
-                    best_subtree_size = subtree_size
-
-                    is_subtree_solved = True
-                    # ---- this is all debug code
-                    if not EXIT_ON_FIRST_SOLUTION and depth <= FIND_OPTIMAL_PROGRESS_LOG_DEPTH:
-                        path = get_chain(guesses, guess_results + [guess_result], depth)
-                        if is_improvement:
-                            if has_prev_tree:
-                                logging.log(
-                                    FIND_OPTIMAL_PROGRESS_LOG_LEVEL,
-                                    "IMPROVEMENT! Word %s solves subtree %s with size %d (prev %d, tree %s). Looking for better solution.",
-                                    GUESS_WORDS[next_guess], path, subtree_size, prev_best_subtree_size, GUESS_WORDS[prev_tree_guess]
-                                )
-                            else:
-                                logging.log(
-                                    FIND_OPTIMAL_PROGRESS_LOG_LEVEL,
-                                    "IMPROVEMENT! Word %s solves subtree %s with size %d (prev %d, no prior tree). Looking for better solution.",
-                                    GUESS_WORDS[next_guess], path, subtree_size, prev_best_subtree_size
-                                )
-                        else:
-                            if has_prev_tree:
-                                logging.log(
-                                    FIND_OPTIMAL_PROGRESS_LOG_LEVEL,
-                                    "Word %s solves subtree %s with size %d (is prior guess? %d). Looking for better solution.",
-                                            GUESS_WORDS[next_guess], path, subtree_size, next_guess == prev_tree_guess
-                                    )
-                            else:
-                                logging.log(
-                                    FIND_OPTIMAL_PROGRESS_LOG_LEVEL,
-                                    "Word %s solves subtree %s with size %d (no prior tree). Looking for better solution.",
-                                    GUESS_WORDS[next_guess], path, subtree_size
-                                )
-                    # ---- this is all debug code
-
-                    # ------ code for EXIT_ON_FIRST_IMPROVEMENT option
-                    if not EXIT_ON_FIRST_SOLUTION and EXIT_ON_FIRST_IMPROVEMENT and has_prev_tree and is_improvement:
-                        # to make things faster when optimizing an input tree, we can exit on the very first improvement
-                        path = get_chain(guesses, guess_results + [guess_result], depth)
-                        prev_best_guess = GUESS_WORDS[prev_tree_guess]
-                        new_best_guess = GUESS_WORDS[next_guess]
-                        logging.log(
-                            EXIT_ON_FIRST_IMPROVEMENT_LOG_LEVEL,
-                            "[d=%d] Found an improvement. OK see you. Path: %s",
-                            depth, path)
-                        logging.log(
-                            EXIT_ON_FIRST_IMPROVEMENT_LOG_LEVEL,
-                            "Previous best guess was %s (%d). New best guess is %s (%d)",
-                            prev_best_guess, prev_best_subtree_size, new_best_guess, best_subtree_size
-                        )
-                        break
-                    # ------ code for EXIT_ON_FIRST_IMPROVEMENT option
-
-                else:
-                    # ---- this is all debug code
-                    if not EXIT_ON_FIRST_SOLUTION and depth <= 1:
-                        path = get_chain(guesses, guess_results + [guess_result], depth)
-                        logging.warning("Word %s solves subtree %s with size %d, but best is %d. Looking for better solution.",
-                                    GUESS_WORDS[next_guess], path, subtree_size, best_subtree_size)
-                    # ---- this is all debug code
-                    pass
-
-                # NOTE: if we don't care about optimality and just want to find *some* subtree that solves
-                # then we can early-exit here
-                if EXIT_ON_FIRST_SOLUTION:
-                    break
-            else:
-                # subtree is not solved
-                # therefore this word should not be considered as a valid guess
-                pass
+        if is_dead_end:
+            is_early_exit = True
+            break
 
-            visited.add(next_guess)
+        if is_subtree_solved:
+            assert best_subtree is not None
+            # need to convert numpy type into python-native type for later serialization
+            action_map[int(guess_result)] = best_subtree
+            if checkpoint is not None and checkpointed is None:
+                checkpoint.add(int(guess_result), best_subtree, best_subtree_size)
 
         tree_found_words.update(best_subtree_found_words)
         tree_size += best_subtree_size
 
-        if size_cutoff > -1 and tree_size >= size_cutoff:
+        if size_cutoff > -1 and tree_size + min_size_left >= size_cutoff:
             # ---- this is all debug code
             if depth <= 2:
-                path = get_chain(guesses, guess_results + [guess_result], depth)
+                path = get_chain(guesses, guess_results + [guess_result], depth, ctx.guess_words)
                 logging.warning("Exceeded size cutoff of %d in subtree. Path: %s", size_cutoff, path)
             # ---- this is all debug code
             is_early_exit = True
             break
 
-        # ---- this is all debug code
-        if USE_OPT_4 and is_opt_4_enabled:
-            logging.log(
-                OPT_4_LOG_LEVEL,
-                "[d=%d] Optimization #4 enabled. # guesses tried for subtree with guess_result %d: %d (is subtree solved? %d)",
-                depth,
-                guess_result,
-                num_guesses_tried,
-                is_subtree_solved,
-            )
-        if DEBUG_HEURISTIC and depth <= 2:
-            logging.info("[d=%d] Tried %d guesses before we found the optimal one for guess result %d (is subtree solved? %d)",
-                         depth, num_guesses_tried, guess_result, is_subtree_solved)
-        # ---- this is all debug code
-
         if not is_subtree_solved:
             # early exit. don't bother trying the other guess results
             # ---- this is all debug code
             if depth <= 3:
-                path = get_chain(guesses, guess_results + [guess_result], depth)
+                path = get_chain(guesses, guess_results + [guess_result], depth, ctx.guess_words)
                 # logging.warning("[d=%d] path %s is a dead end or suboptimal. Backtracking.", depth, path)
             # ---- this is all debug code
             is_early_exit = True
@@ -743,21 +679,19 @@ def construct_tree(
 
     # ---- this is all debug code
     if not is_early_exit and depth <= MAX_PROGRESS_DEPTH:
-        path = get_chain(guesses[:-1], guess_results, depth - 1)
+        path = get_chain(guesses[:-1], guess_results, depth - 1, ctx.guess_words)
         logging.log(
-            PROGRESS_LOG_LEVEL,
+            ctx.progress_log_level,
             "Guess %s solves subtree: %s (is subtree guess? %d)",
-            GUESS_WORDS[latest_guess],
+            ctx.guess_words[latest_guess],
             path,
             has_prev_tree
         )
-    if USE_CHECKPOINTS and not is_early_exit and depth <= CHECKPOINT_DEPTH:
-        checkpoint_tree(guesses, guess_results, depth, tree, GUESS_WORDS, table)
     # ---- this is all debug code
 
-    if IS_TIMING_ENABLED and TIMING_DEPTH == depth:
+    if ctx.is_timing_enabled and TIMING_DEPTH == depth:
         stop = time.time()
-        path = get_chain(guesses, guess_results, depth)
+        path = get_chain(guesses, guess_results, depth, ctx.guess_words)
         logging.info(
             "Expanded %d states at depth %d. Took %.2f seconds. Path: %s",
             num_states_opened,
@@ -769,6 +703,394 @@ def construct_tree(
     return tree, tree_found_words, tree_size, num_states_opened
 
 
+# the result of solving the subtree for one partition (see solve_partition)
+PartitionResult = Tuple[Optional[dict], AnswerSet, int, int, bool, bool]
+
+
+def get_possible_results(latest_guess: int, ctx: SearchContext) -> np.ndarray:
+    """
+    Return the possible results for this guess, largest partition first
+    NOTE: this may look at partitions that don't actually exist
+    """
+    if ctx.index is None:
+        possible_results, counts = np.unique(ctx.table[latest_guess], return_counts=True)
+    else:
+        partition_sizes = ctx.index.get_partition_sizes(latest_guess).astype(np.int64)
+        possible_results = np.flatnonzero(partition_sizes)
+        counts = partition_sizes[possible_results]
+    # a further optimization: we should try the partitions with the *most* possible answers *first*
+    si = np.argsort(-1 * counts)
+    return np.take_along_axis(possible_results, si, axis=0)
+
+
+def iter_partitions(
+    latest_guess: int, possible_results: np.ndarray, possible_answers: AnswerSet, ctx: SearchContext
+) -> Iterator[Tuple[int, AnswerSet]]:
+    """
+    Yield (guess result, possible answers for that result) for every partition which still needs a subtree, in the order of possible_results
+    This is lazy because the search usually gives up on a node before looking at all of them
+    """
+    for guess_result in possible_results:
+        if guess_result == ALL_LETTERS_CORRECT:
+            # either we've guessed the word (no need to add it to the decision tree)
+            # or the guess isn't a possible answer, and there is nothing to find here
+            continue
+
+        if ctx.index is None:
+            possible_answers_for_result = np.where(ctx.table[latest_guess] == guess_result)[0]
+            possible_answers_for_result_s = AnswerSet.from_ids(possible_answers_for_result)
+        else:
+            # O(k) slice of the index rather than a scan over the whole row
+            possible_answers_for_result_s = ctx.index.get_answer_set(latest_guess, guess_result)
+        new_possible_answers = possible_answers & possible_answers_for_result_s
+
+        if not new_possible_answers:
+            # this is a combo of guesses that simply doesn't yield any valid words remaining
+            # so there's no need to add it to the decision tree
+            continue
+
+        yield int(guess_result), new_possible_answers
+
+
+def solve_partition(
+    guesses: List[int],
+    guess_results: List[int],
+    guess_result: int,
+    possible_answers: AnswerSet,
+    depth: int,
+    ctx: SearchContext,
+    size_cutoff: int = -1,
+    tree: Optional[Dict[int, dict]] = None,
+    excluded_letters: int = 0,
+) -> PartitionResult:
+    """
+    Find the best subtree for one result of the last guess (one partition in construct_tree)
+
+    :param guess_result:        The result of the last guess
+    :param possible_answers:    The possible answers left after that result
+    :param size_cutoff:         Budget for the subtree: only subtrees smaller than this are accepted. -1 for no budget
+    :param tree:                The subtree for this result in a previously constructed tree, if any
+    :param excluded_letters:    The letters known to be absent before the last guess, as a 26-bit mask
+
+    Return a tuple of 6 items:
+        - subtree ->            The best subtree found, or None
+        - found_words ->        The words reachable from that subtree
+        - subtree_size ->       The size of that subtree (size_cutoff if none was found)
+        - num_states_opened ->  The number of states that we tried
+        - is_subtree_solved ->  Whether we found a subtree which reaches every possible answer
+        - is_dead_end ->        Whether we gave up without trying any guesses, because there aren't enough guesses left
+    """
+    # a previous tree changes which guesses we try, so those results can't be shared with other paths
+    transpositions = ctx.transpositions if tree is None else None
+    if transpositions is not None:
+        result = transpositions.lookup(possible_answers, depth, size_cutoff)
+        if result is not None:
+            return result
+
+    result = search_partition(guesses, guess_results, guess_result, possible_answers, depth, ctx, size_cutoff, tree, excluded_letters)
+    # a search cut short by the deadline may have missed subtrees, so don't remember it
+    if transpositions is not None and not ctx.is_out_of_time():
+        transpositions.store(possible_answers, depth, size_cutoff, result)
+    return result
+
+
+def search_partition(
+    guesses: List[int],
+    guess_results: List[int],
+    guess_result: int,
+    possible_answers: AnswerSet,
+    depth: int,
+    ctx: SearchContext,
+    size_cutoff: int = -1,
+    tree: Optional[Dict[int, dict]] = None,
+    excluded_letters: int = 0,
+) -> PartitionResult:
+    """The search behind solve_partition, without looking at the transposition table"""
+    has_prev_tree = tree is not None
+    num_states_opened = 0
+
+    # in hard mode, only the guesses which use all the hints so far can be tried
+    allowed = None  # type: Optional[np.ndarray]
+    if ctx.hard_mode_filter is not None:
+        allowed = ctx.hard_mode_filter.get_allowed(guesses, guess_results + [guess_result])
+
+    # add the letters we just found out are absent
+    excluded_letters |= ctx.get_absent_letters(int(guesses[-1]), guess_result)
+
+    next_guesses_it = []  # type: Iterable[int]
+
+    best_subtree = None  # type: Optional[dict]
+    best_subtree_size = size_cutoff
+    best_subtree_found_words = AnswerSet()
+
+    # number of guesses tried to find the optimal subtree
+    # keep track of this for DEBUG_HEURISTIC
+    num_guesses_tried = 0
+
+    # true iff we found a guess that solves this subtree (works with this guess result)
+    is_subtree_solved = False
+
+    is_opt_4_enabled = False
+
+    # lower bound on the size of the subtree for each guess, if we have one
+    min_tree_sizes = None  # type: Optional[np.ndarray]
+
+    if len(possible_answers) == 1:
+        # Optimization #1: if there is only one possible answer, then we guess only that answer
+        # then we guess that word
+        answer = possible_answers.first()
+        next_guesses_it = [answer]
+        # logging.info("Applying optimization #1 at depth %d", depth)
+    elif depth == (ctx.max_depth - 1) and len(possible_answers) > 1:
+        # Optimization #2: if we have 1 guess remaining and there are many (>1) possible words
+        # then we can just guess any of those words
+        # it doesn't matter, we will only be able to reach one of them anyway
+        # save time on not trying more possibilities
+        logging.debug("Applying optimization #2 at depth 5 - early exit")
+        return None, best_subtree_found_words, best_subtree_size, num_states_opened, False, True
+    elif depth == (ctx.max_depth - 2):
+        # Optimization #3: we have only 2 guesses left
+        # we need to pick the guess that divides the space such that, for all possible remaining answers, we can solve the puzzle using the last guess
+        # i.e. we want all partitions to have size 1
+        # is there any guess that has a worst partition of 1?
+        if allowed is None:
+            worst_partition_arr = get_worst_partition_arr(ctx.table, possible_answers)
+            good_guesses = np.where(worst_partition_arr == 1)[0]
+        else:
+            # in hard mode, only score the guesses we're allowed to make
+            allowed_guesses = np.flatnonzero(allowed)
+            worst_partition_arr = get_worst_partition_arr(ctx.table, possible_answers, allowed_guesses)
+            good_guesses = allowed_guesses[worst_partition_arr == 1]
+        if good_guesses.size == 0:
+            logging.log(
+                OPT_3_LOG_LEVEL,
+                "Optimization #3 enabled: there is *no* good partition at depth 4. Exiting early.",
+            )
+            return None, best_subtree_found_words, best_subtree_size, num_states_opened, False, True
+        else:
+            # this is our optimal partition
+            opt = int(good_guesses[0])
+            next_guesses_it = [opt]
+            logging.log(
+                OPT_3_LOG_LEVEL,
+                "Optimization #3 enabled: Found the optimal partition at depth 4",
+            )
+    elif ctx.use_opt_4 and depth <= (ctx.max_depth - 3):
+        # Optimization #4
+        # instead of using our weak heuristic, use a slower but better heuristic to select guesses
+        logging.log(OPT_4_LOG_LEVEL, "Optimization #4 enabled at depth %d", depth)
+        scores = score_guesses(ctx.table, get_answers_arr(possible_answers))
+        next_guesses_it = NEW_pick_next_guesses_it(
+            guesses, guess_results, ctx.table, possible_answers, allowed, scores
+        )
+        is_opt_4_enabled = True
+        if not ctx.exit_on_first_solution:
+            # branch and bound: we can skip the guesses whose subtree can't beat the best one so far
+            min_tree_sizes = get_min_guess_tree_sizes(scores.hist, depth)
+            if size_cutoff > -1 and min_tree_sizes.min() >= size_cutoff:
+                return None, best_subtree_found_words, best_subtree_size, num_states_opened, False, False
+    else:
+        next_guesses_it = pick_next_guesses_it(
+            guesses, excluded_letters, ctx.sorted_guesses, ctx.sorted_guess_masks, ctx.sorted_guess_ranks, allowed,
+            ctx.exit_on_first_solution,
+        )
+
+    # if we have a previous tree, we may try the same next_guess for a given guess_result more than once
+    # this will prevent us from doing that
+    visited = set([])  # type: Set[int]
+    prev_tree_guess = -1
+
+    if has_prev_tree:
+        # the action map is a mapping from guess_result (converted to string) to dictionary
+        # the dictionary will be rooted at a single key (string)
+        # that key will correspond to an integer
+        assert tree is not None
+        prev_tree_guess = list(tree.keys())[0]
+        logging.log(
+            PREV_TREE_LOG_LEVEL,
+            "%s[d=%d] Previous guess at this spot was %s",
+            '\t' * depth, depth, ctx.guess_words[prev_tree_guess]
+        )
+        # add our guess to the front of those that we try
+        # (unless it breaks the hard mode rules, in which case this subtree is rebuilt from scratch)
+        if allowed is None or allowed[prev_tree_guess]:
+            next_guesses_it = itertools.chain([prev_tree_guess], next_guesses_it)
+
+    for ngi, next_guess in enumerate(next_guesses_it):
+        if next_guess in visited:
+            continue
+        if ctx.is_out_of_time():
+            break
+        if not ctx.exit_on_first_solution and OPTIMIZE_MAX_GUESSES_PER_RESULT > -1 and ngi >= OPTIMIZE_MAX_GUESSES_PER_RESULT:
+            if depth <= 1:
+                logging.warning("[d=%d] Reached max # of guesses (%d) for guess result %s. Not looking for better guesses.",
+                                depth, OPTIMIZE_MAX_GUESSES_PER_RESULT, guess_response_to_string(guess_result))
+            break
+        if min_tree_sizes is not None and best_subtree_size > -1 and min_tree_sizes[next_guess] >= best_subtree_size:
+            # this guess can't beat the best subtree so far
+            continue
+
+        # ---- this is all debug code
+        if ctx.use_opt_4 and is_opt_4_enabled:
+            logging.log(
+                OPT_4_LOG_LEVEL,
+                "[d=%d] Optimization #4 enabled. Trying guess %d instead for guess_result %d",
+                depth,
+                next_guess,
+                guess_result,
+            )
+        # ---- this is all debug code
+
+        subtree = None  # type: Optional[dict]
+        if has_prev_tree:
+            if prev_tree_guess == next_guess:
+                subtree = tree
+
+        subtree, subtree_found_words, subtree_size, subtree_states_opened = construct_tree(
+            guesses=guesses + [next_guess],
+            guess_results=guess_results + [guess_result],
+            possible_answers=possible_answers,
+            depth=depth + 1,
+            ctx=ctx,
+            size_cutoff=best_subtree_size,
+            tree=subtree,
+            excluded_letters=excluded_letters,
+        )
+
+        num_states_opened += subtree_states_opened
+        num_guesses_tried += 1
+
+        if len(subtree_found_words) == len(possible_answers):
+            if best_subtree_size == -1 or subtree_size < best_subtree_size:
+                best_subtree = subtree
+                is_improvement = (best_subtree_size > -1) and not (has_prev_tree and guesses[-1] == prev_tree_guess)
+                prev_best_subtree_size = best_subtree_size
+                # update best subtree size
+                best_subtree_found_words = subtree_found_words
+                best_subtree_size = subtree_size
+
+                is_subtree_solved = True
+                # ---- this is all debug code
+                if not ctx.exit_on_first_solution and depth <= FIND_OPTIMAL_PROGRESS_LOG_DEPTH:
+                    path = get_chain(guesses, guess_results + [guess_result], depth, ctx.guess_words)
+                    if is_improvement:
+                        if has_prev_tree:
+                            logging.log(
+                                FIND_OPTIMAL_PROGRESS_LOG_LEVEL,
+                                "IMPROVEMENT! Word %s solves subtree %s with size %d (prev %d, tree %s). Looking for better solution.",
+                                ctx.guess_words[next_guess], path, subtree_size, prev_best_subtree_size, ctx.guess_words[prev_tree_guess]
+                            )
+                        else:
+                            logging.log(
+                                FIND_OPTIMAL_PROGRESS_LOG_LEVEL,
+                                "IMPROVEMENT! Word %s solves subtree %s with size %d (prev %d, no prior tree). Looking for better solution.",
+                                ctx.guess_words[next_guess], path, subtree_size, prev_best_subtree_size
+                            )
+                    else:
+                        if has_prev_tree:
+                            logging.log(
+                                FIND_OPTIMAL_PROGRESS_LOG_LEVEL,
+                                "Word %s solves subtree %s with size %d (is prior guess? %d). Looking for better solution.",
+                                        ctx.guess_words[next_guess], path, subtree_size, next_guess == prev_tree_guess
+                                )
+                        else:
+                            logging.log(
+                                FIND_OPTIMAL_PROGRESS_LOG_LEVEL,
+                                "Word %s solves subtree %s with size %d (no prior tree). Looking for better solution.",
+                                ctx.guess_words[next_guess], path, subtree_size
+                            )
+                # ---- this is all debug code
+
+                # ------ code for EXIT_ON_FIRST_IMPROVEMENT option
+                if not ctx.exit_on_first_solution and EXIT_ON_FIRST_IMPROVEMENT and has_prev_tree and is_improvement:
+                    # to make things faster when optimizing an input tree, we can exit on the very first improvement
+                    path = get_chain(guesses, guess_results + [guess_result], depth, ctx.guess_words)
+                    prev_best_guess = ctx.guess_words[prev_tree_guess]
+                    new_best_guess = ctx.guess_words[next_guess]
+                    logging.log(
+                        EXIT_ON_FIRST_IMPROVEMENT_LOG_LEVEL,
+                        "[d=%d] Found an improvement. OK see you. Path: %s",
+                        depth, path)
+                    logging.log(
+                        EXIT_ON_FIRST_IMPROVEMENT_LOG_LEVEL,
+                        "Previous best guess was %s (%d). New best guess is %s (%d)",
+                        prev_best_guess, prev_best_subtree_size, new_best_guess, best_subtree_size
+                    )
+                    break
+                # ------ code for EXIT_ON_FIRST_IMPROVEMENT option
+
+            else:
+                # ---- this is all debug code
+                if not ctx.exit_on_first_solution and depth <= 1:
+                    path = get_chain(guesses, guess_results + [guess_result], depth, ctx.guess_words)
+                    logging.warning("Word %s solves subtree %s with size %d, but best is %d. Looking for better solution.",
+                                ctx.guess_words[next_guess], path, subtree_size, best_subtree_size)
+                # ---- this is all debug code
+                pass
+
+            # NOTE: if we don't care about optimality and just want to find *some* subtree that solves
+            # then we can early-exit here
+            if ctx.exit_on_first_solution:
+                break
+        else:
+            # subtree is not solved
+            # therefore this word should not be considered as a valid guess
+            pass
+
+        visited.add(next_guess)
+
+    # ---- this is all debug code
+    if ctx.use_opt_4 and is_opt_4_enabled:
+        logging.log(
+            OPT_4_LOG_LEVEL,
+            "[d=%d] Optimization #4 enabled. # guesses tried for subtree with guess_result %d: %d (is subtree solved? %d)",
+            depth,
+            guess_result,
+            num_guesses_tried,
+            is_subtree_solved,
+        )
+    if DEBUG_HEURISTIC and depth <= 2:
+        logging.info("[d=%d] Tried %d guesses before we found the optimal one for guess result %d (is subtree solved? %d)",
+                     depth, num_guesses_tried, guess_result, is_subtree_solved)
+    # ---- this is all debug code
+
+    return best_subtree, best_subtree_found_words, best_subtree_size, num_states_opened, is_subtree_solved, False
+
+
+# the search context in each worker process
+# with fork, the workers inherit the parent's context. Otherwise each one builds its own in _init_search_worker
+_WORKER_CTX = None  # type: Optional[SearchContext]
+
+
+def _init_search_worker(dictionary: str, max_depth: int, find_optimal: bool, hard_mode: bool):
+    # the table is memory-mapped, so all the workers share the same pages
+    global _WORKER_CTX
+    _WORKER_CTX = make_search_context(dictionary, max_depth, find_optimal=find_optimal, hard_mode=hard_mode)
+
+
+def make_search_pool(ctx: SearchContext, dictionary: str, jobs: int) -> multiprocessing.pool.Pool:
+    """
+    Return a pool of workers which search with the same settings as ctx
+    Where we can fork, the workers share ctx (copy-on-write) rather than each loading the table, the sorted guesses
+    and the partition index again, which costs more than the first-solution search saves
+    """
+    global _WORKER_CTX
+    if "fork" in multiprocessing.get_all_start_methods():
+        _WORKER_CTX = ctx
+        return multiprocessing.get_context("fork").Pool(jobs)
+    return multiprocessing.Pool(
+        jobs,
+        initializer=_init_search_worker,
+        initargs=(dictionary, ctx.max_depth, not ctx.exit_on_first_solution, ctx.hard_mode_filter is not None),
+    )
+
+
+def _solve_partition_in_worker(task: Tuple[List[int], List[int], int, AnswerSet, int, Optional[dict], int]) -> PartitionResult:
+    guesses, guess_results, guess_result, possible_answers, depth, tree, excluded_letters = task
+    assert _WORKER_CTX is not None
+    return solve_partition(guesses, guess_results, guess_result, possible_answers, depth, _WORKER_CTX, tree=tree, excluded_letters=excluded_letters)
+
+
 def check_is_reachable(
     guesses: List[int], guess_results: List[int], table: np.ndarray, target_word: int
 ) -> bool:
@@ -790,33 +1112,388 @@ def check_is_reachable(
     return is_reachable
 
 
-def solve(dictionary: str, first_word: str, max_depth: int, find_optimal: bool = False, tree_file: Optional[str] = None):
+def load_sorted_guesses(
+    dictionary: str, table: np.ndarray, guess_words: List[str], answer_words: List[str]
+) -> np.ndarray:
+    """
+    Return the guess word indexes sorted by their mean partition over all the answers (lowest score first)
+    The scores are cached in the cache directory
+    """
+    mean_part_df = None
+    cache_path = f"cache/mean_partition-{dictionary}.parquet"
+    if not os.path.exists(cache_path):
+        df = pd.DataFrame(table, index=guess_words, columns=answer_words)
+        df["word_index"] = np.arange(len(guess_words))
+        print("Computing mean partition...")
+        mean_part_df = df.apply(get_mean_partition, axis=1)
+        mean_part_df = pd.DataFrame(mean_part_df, columns=["mean_partition"])
+        mean_part_df["word_index"] = np.arange(len(guess_words))
+        print(mean_part_df.sort_values(by="mean_partition"))
+        mean_part_df.to_parquet(cache_path)
+        print(f"Saved mean partition df to file {cache_path}")
+    else:
+        mean_part_df = pd.read_parquet(cache_path)
+        print("Loaded mean partition DF from cache")
+
+    # lower score is better
+    # sort word indexes based on their score in above score dict
+    # sorted in ascending order (lowest score first)
+    return mean_part_df.sort_values("mean_partition")["word_index"].values
+
+
+def make_search_context(
+    dictionary: str, max_depth: int, find_optimal: bool = False, hard_mode: bool = False
+) -> SearchContext:
+    """Load everything needed to search for trees over this dictionary"""
+    # the table file contains the words for its rows and columns
+    possibilities = load_possibilities(dictionary)
+    guess_words = possibilities.guess_words
+    answer_words = possibilities.answer_words
+    print(f"Loaded {len(guess_words)} words")
+
+    table = possibilities.table
+    print(f"Loaded {table.shape} table")
+    index = load_dictionary_partition_index(dictionary, possibilities)
+    sorted_guesses = load_sorted_guesses(dictionary, table, guess_words, answer_words)
+
+    ctx = SearchContext(
+        table,
+        guess_words,
+        answer_words,
+        sorted_guesses,
+        index=index,
+        hard_mode_filter=HardModeFilter(guess_words) if hard_mode else None,
+        content_hash=possibilities.content_hash,
+        max_depth=max_depth,
+        exit_on_first_solution=not find_optimal,
+    )
+    # in hard mode the guesses we can try depend on the whole path, not just the answers left
+    # and the black-letter heuristic (used without optimization #4) does too
+    # only the optimal search comes back to the same answers at the same depth: the first solution search never got a hit
+    if USE_TRANSPOSITION_TABLE and find_optimal and not hard_mode and ctx.use_opt_4:
+        ctx.transpositions = TranspositionTable()
+
+    # set optimization options based on the dictionary
+    if dictionary == "answers":
+        ctx.progress_log_level = logging.DEBUG
+        if ctx.exit_on_first_solution:
+            ctx.use_tqdm_low_depths = False
+        ctx.is_timing_enabled = False
+        ctx.use_checkpoints = False
+    return ctx
+
+
+def build_tree(
+    ctx: SearchContext,
+    root_word_index: int,
+    tree: Optional[dict],
+    dictionary: str,
+    jobs: int = 1,
+    checkpoint: Optional[TreeCheckpoint] = None,
+) -> Tuple[dict, AnswerSet, int, int]:
+    """Search for a tree rooted at root_word_index with the options in ctx. Return the same tuple as construct_tree"""
+    possible_answers = AnswerSet.full(len(ctx.answer_words))
+    if jobs > 1 and ctx.exit_on_first_solution:
+        # the first-solution search only takes seconds once the table is loaded, so a pool costs more than it saves
+        logging.warning("Only the optimal search is solved in parallel. Ignoring --jobs")
+    elif jobs > 1:
+        logging.info("Solving the partitions of the first word with %d jobs", jobs)
+        with make_search_pool(ctx, dictionary, jobs) as pool:
+            return construct_tree(
+                guesses=[root_word_index],
+                guess_results=[],
+                depth=1,
+                possible_answers=possible_answers,
+                ctx=ctx,
+                tree=tree,
+                pool=pool,
+                checkpoint=checkpoint,
+            )
+    return construct_tree(
+        guesses=[root_word_index],
+        guess_results=[],
+        depth=1,
+        possible_answers=possible_answers,
+        ctx=ctx,
+        tree=tree,
+        checkpoint=checkpoint,
+    )
+
+
+def make_checkpoint(
+    ctx: SearchContext, dictionary: str, first_word: str, resume: bool, tree_file: Optional[str] = None
+) -> Optional[TreeCheckpoint]:
+    """
+    Return the checkpoint for this search, or None if checkpoints are disabled
+    :param resume:      Whether to pick up the partitions solved by a previous run of the same search. Otherwise start over
+    :param tree_file:   The tree file given to guide the search, if any. Part of the key of the checkpoint
+    """
+    if not ctx.use_checkpoints or ctx.content_hash is None:
+        if resume:
+            logging.warning("Checkpoints are disabled. Can't resume")
+        return None
+    checkpoint = TreeCheckpoint(
+        dictionary,
+        first_word,
+        ctx.max_depth,
+        not ctx.exit_on_first_solution,
+        ctx.hard_mode_filter is not None,
+        ctx.content_hash,
+        get_tree_file_hash(tree_file) if tree_file else None,
+    )
+    if resume:
+        if checkpoint.load():
+            logging.info("Resuming from checkpoint %s: %d partitions already solved", checkpoint.path, len(checkpoint))
+        else:
+            logging.warning("No checkpoint to resume from at %s. Starting over", checkpoint.path)
+    return checkpoint
+
+
+class TreePartition:
+    """One partition in a complete tree, with what solve_partition needs to search for a better subtree for it"""
+
+    def __init__(
+        self,
+        guesses: List[int],
+        guess_results: List[int],
+        guess_result: int,
+        possible_answers: AnswerSet,
+        depth: int,
+        excluded_letters: int,
+        action_map: Dict[int, dict],
+        parent: Optional["TreePartition"],
+    ):
+        """
+        :param depth:       The depth of the last guess
+        :param action_map:  action_map[guess_result] is the current subtree for this partition
+        :param parent:      The partition this one is in, if any
+        """
+        self.guesses = guesses
+        self.guess_results = guess_results
+        self.guess_result = guess_result
+        self.possible_answers = possible_answers
+        self.depth = depth
+        self.excluded_letters = excluded_letters
+        self.action_map = action_map
+        self.parent = parent
+        # the size of the current subtree
+        self.size = 0
+
+    @property
+    def key(self) -> Tuple[int, int]:
+        return self.possible_answers.bits, self.depth
+
+
+def collect_tree_partitions(
+    tree: Dict[int, dict],
+    guesses: List[int],
+    guess_results: List[int],
+    depth: int,
+    possible_answers: AnswerSet,
+    ctx: SearchContext,
+    out: List[TreePartition],
+    excluded_letters: int = 0,
+    parent: Optional[TreePartition] = None,
+) -> int:
+    """
+    Add every partition below the root of this tree to `out`, parents before their children
+    :param depth:   The depth of the root guess of the tree
+    Return the size of the tree
+    """
+    latest_guess = next(iter(tree))
+    guesses = guesses + [latest_guess]
+    action_map = tree[latest_guess]
+    tree_size = depth if latest_guess in possible_answers else 0
+    answers_arr = get_answers_arr(possible_answers)
+    results = ctx.table[latest_guess, answers_arr]
+    for guess_result in np.unique(results):
+        if guess_result == ALL_LETTERS_CORRECT:
+            continue
+        guess_result = int(guess_result)
+        partition = TreePartition(
+            guesses,
+            guess_results,
+            guess_result,
+            AnswerSet.from_ids(answers_arr[results == guess_result]),
+            depth,
+            excluded_letters,
+            action_map,
+            parent,
+        )
+        out.append(partition)
+        partition.size = collect_tree_partitions(
+            action_map[guess_result],
+            guesses,
+            guess_results + [guess_result],
+            depth + 1,
+            partition.possible_answers,
+            ctx,
+            out,
+            excluded_letters | ctx.get_absent_letters(latest_guess, guess_result),
+            partition,
+        )
+        tree_size += partition.size
+    return tree_size
+
+
+def get_min_partition_tree_size(possible_answers: AnswerSet, depth: int, ctx: SearchContext) -> int:
+    """Return a lower bound on the size of any subtree for these answers, when the last guess was at depth"""
+    scores = score_guesses(ctx.table, get_answers_arr(possible_answers))
+    return int(get_min_guess_tree_sizes(scores.hist, depth).min())
+
+
+def write_tree(tree: dict, out_path: str) -> None:
+    # write to a temporary file first, so that killing the process never leaves a half-written tree behind
+    tmp_path = out_path + ".tmp"
+    with open(tmp_path, "w") as out_fp:
+        json.dump(tree, out_fp, indent=4, sort_keys=True)
+    os.replace(tmp_path, out_path)
+
+
+def optimize_tree(
+    tree: Dict[int, dict], ctx: SearchContext, time_budget: float, out_path: str
+) -> Tuple[Dict[int, dict], int]:
+    """
+    Anytime search: improve a complete tree one partition at a time until we run out of time (or can't improve it any more).
+    Each round we search again for the partition with the largest expected gain,
+    i.e. the largest gap between the size of its subtree and the lower bound on the size of any subtree for it.
+    A search that runs to completion finds the best subtree there is (as far as the search can tell), so we don't bother with
+    the partitions below it. One that runs out of its ANYTIME_PARTITION_TIME_LIMIT still keeps any improvement it found,
+    and the partitions below it get their turn.
+    The best tree so far is written to out_path every ANYTIME_WRITE_INTERVAL seconds (if it improved), and at the end
+    :param time_budget:     In seconds
+    Return the best tree and its size
+    """
+    assert not ctx.exit_on_first_solution
+    end_time = time.time() + time_budget
+    possible_answers = AnswerSet.full(len(ctx.answer_words))
+
+    # (answers bits, depth) -> lower bound on the size of the subtree
+    min_sizes = {}  # type: Dict[Tuple[int, int], int]
+    # (answers bits, depth) of the partitions we have searched, and of those where the search ran to completion
+    searched = set()  # type: Set[Tuple[int, int]]
+    finished = set()  # type: Set[Tuple[int, int]]
+    num_states_opened = 0
+
+    partitions = []  # type: List[TreePartition]
+    tree_size = collect_tree_partitions(tree, [], [], 1, possible_answers, ctx, partitions)
+    write_tree(tree, out_path)
+    logging.info("Wrote starting tree of size %d to %s", tree_size, out_path)
+    last_write_time = time.time()
+    is_written = True
+
+    while time.time() < end_time:
+        best_gain = 0
+        best_partition = None  # type: Optional[TreePartition]
+        # partitions below a finished search
+        done = set()  # type: Set[int]
+        for partition in partitions:
+            parent = partition.parent
+            if parent is not None and (id(parent) in done or parent.key in finished):
+                done.add(id(partition))
+                continue
+            key = partition.key
+            if key in searched:
+                continue
+            num_answers = len(partition.possible_answers)
+            # the bound for any number of answers is cheap, and enough to rule out most (small) partitions
+            if partition.size <= get_min_tree_sizes(num_answers, partition.depth)[num_answers]:
+                continue
+            if key not in min_sizes:
+                min_sizes[key] = get_min_partition_tree_size(partition.possible_answers, partition.depth, ctx)
+            gain = partition.size - min_sizes[key]
+            if gain > best_gain:
+                best_gain = gain
+                best_partition = partition
+        if best_partition is None:
+            logging.info("No partition left to improve")
+            break
+
+        partition = best_partition
+        searched.add(partition.key)
+        ctx.deadline = min(end_time, time.time() + ANYTIME_PARTITION_TIME_LIMIT)
+        subtree, _, subtree_size, states_opened, is_subtree_solved, _ = solve_partition(
+            guesses=partition.guesses,
+            guess_results=partition.guess_results,
+            guess_result=partition.guess_result,
+            possible_answers=partition.possible_answers,
+            depth=partition.depth,
+            ctx=ctx,
+            size_cutoff=partition.size,
+            excluded_letters=partition.excluded_letters,
+        )
+        num_states_opened += states_opened
+        if not ctx.is_out_of_time():
+            finished.add(partition.key)
+        ctx.deadline = None
+
+        if is_subtree_solved:
+            assert subtree is not None
+            partition.action_map[partition.guess_result] = subtree
+            is_written = False
+            # the partitions below this one have changed
+            # (and the subtree may be shared with other paths through the transposition table, so size the whole tree again)
+            partitions = []
+            tree_size = collect_tree_partitions(tree, [], [], 1, possible_answers, ctx, partitions)
+            logging.info(
+                "Improved subtree %s from %d to %d. Tree size is now %d",
+                get_chain(partition.guesses, partition.guess_results + [partition.guess_result], partition.depth, ctx.guess_words),
+                partition.size, subtree_size, tree_size
+            )
+
+        if not is_written and time.time() - last_write_time >= ANYTIME_WRITE_INTERVAL:
+            write_tree(tree, out_path)
+            logging.info("Wrote tree of size %d to %s", tree_size, out_path)
+            last_write_time = time.time()
+            is_written = True
+
+    if time.time() >= end_time:
+        logging.info("Ran out of time")
+    if not is_written:
+        write_tree(tree, out_path)
+        logging.info("Wrote tree of size %d to %s", tree_size, out_path)
+    print(f"# states opened: {num_states_opened:,}")
+    return tree, tree_size
+
+
+def get_tree_out_path(dictionary: str, first_word: str, hard_mode: bool) -> str:
+    """Return a path for a new tree file. This will make sure we don't overwrite any existing files"""
+    mode = "-hard-mode" if hard_mode else ""
+    out_path = f"out/decision-trees/{dictionary}/{first_word}{mode}.json"
+    i = 0
+    while os.path.exists(out_path):
+        i += 1
+        out_path = f"out/decision-trees/{dictionary}/{first_word}{mode}-{i}.json"
+    return out_path
+
+
+def solve(
+    dictionary: str,
+    first_word: str,
+    max_depth: int,
+    find_optimal: bool = False,
+    tree_file: Optional[str] = None,
+    hard_mode: bool = False,
+    jobs: int = 1,
+    time_budget: Optional[float] = None,
+    checkpoint: bool = False,
+    resume: bool = False,
+):
     """
     :param find_optimal:     Whether to solve the decision tree optimally or just find some solution
     :param tree_file:        The path to a previously solved decision tree for this first word
+    :param hard_mode:        Whether every guess after the first has to use all the hints revealed so far
+    :param jobs:             With more than 1 job (and find_optimal), the subtrees for the results of the first word are solved in a pool of worker processes
+    :param time_budget:      If set (in seconds), improve the tree from tree_file (or a quickly found tree) until we run out of time,
+                             writing out the best tree so far as we go. Requires find_optimal
+    :param checkpoint:       Whether to save each solved result of the first word, so that the search can be resumed if it gets killed
+    :param resume:           Whether to skip the results of the first word already solved by a previous (killed) run of the same search
     """
     assert first_word is not None
     logging.info("Using dictionary '%s'", dictionary)
     logging.info("Building decision tree using root word %s", first_word)
     logging.info("Max depth is set to %d", max_depth)
 
-    words = []  # type: List[str]
-    if dictionary == "full" or dictionary == "asymmetric":
-        words = read_parsed_words()
-    else:
-        words = [word.lower() for word in read_all_answers()]
-
-    guess_words = words
-    answer_words = words
-    if dictionary == "asymmetric":
-        # actually need to use another set of files
-        with open("./data-parsed/possibilities-keys-asymmetric.pickle", "rb") as fp:
-            guess_words, answer_words = pickle.load(fp)
-
-        # now verify that they are loaded correctly
-        for i in range(len(answer_words)):
-            assert answer_words[i] == guess_words[i]
-
     tree = None  # type: Optional[dict]
     if tree_file:
         if not find_optimal:
@@ -824,63 +1501,30 @@ def solve(dictionary: str, first_word: str, max_depth: int, find_optimal: bool =
         tree = load_tree(tree_file)
         logging.info(f"Loaded tree from file {tree_file}")
 
-    global MAX_DEPTH
-    MAX_DEPTH = max_depth
-    global EXIT_ON_FIRST_SOLUTION
-    EXIT_ON_FIRST_SOLUTION = not find_optimal
+    if time_budget is not None and not find_optimal:
+        raise Exception("Should not supply a time budget unless we're looking for an optimal result")
 
-    if not EXIT_ON_FIRST_SOLUTION:
+    if find_optimal:
         logging.warning("Looking for optimal decision tree rather than the first one we find")
         logging.warning("This takes a while...")
     else:
         logging.warning("Not looking for an optimal solution, just *a* solution")
 
-    if not EXIT_ON_FIRST_SOLUTION and EXIT_ON_FIRST_IMPROVEMENT:
+    if find_optimal and EXIT_ON_FIRST_IMPROVEMENT:
         logging.warning("Not looking for optimal solution, just an improvement over the existing one")
 
-    if not EXIT_ON_FIRST_SOLUTION and OPTIMIZE_MAX_GUESSES_PER_RESULT > -1:
+    if find_optimal and OPTIMIZE_MAX_GUESSES_PER_RESULT > -1:
         logging.warning("Limiting search to %d guesses per result", OPTIMIZE_MAX_GUESSES_PER_RESULT)
 
-    print(f"Loaded {len(words)} words")
-    # NOTE: this is bad practice but it is accessed in the global scope
-    global GUESS_WORDS
-    GUESS_WORDS = guess_words
-    global ANSWER_WORDS
-    ANSWER_WORDS = answer_words
-
-    table = np.zeros(shape=(1, 1), dtype='uint8')  # type: np.ndarray
-    if dictionary == "full":
-        table = np.load(TABLE_PATH)
-    elif dictionary == "asymmetric":
-        table = np.load(TABLE_PATH_ASYMMETRIC)
-    else:
-        table = np.load(TABLE_PATH_CHEATING)
-    print(f"Loaded {table.shape} table")
+    if hard_mode:
+        logging.info("Building a tree for hard mode")
 
-    mean_part_df = None
-    cache_path = f"cache/mean_partition-{args.dictionary}.parquet"
-    if not os.path.exists(cache_path):
-        df = pd.DataFrame(table, index=guess_words, columns=answer_words)
-        df["word_index"] = np.arange(len(guess_words))
-        print("Computing mean partition...")
-        mean_part_df = df.apply(get_mean_partition, axis=1)
-        mean_part_df = pd.DataFrame(mean_part_df, columns=["mean_partition"])
-        mean_part_df["word_index"] = np.arange(len(guess_words))
-        print(mean_part_df.sort_values(by="mean_partition"))
-        mean_part_df.to_parquet(cache_path)
-        print(f"Saved mean partition df to file {cache_path}")
-    else:
-        mean_part_df = pd.read_parquet(cache_path)
-        print("Loaded mean partition DF from cache")
-
-    # lower score is better
-    # sort word indexes based on their score in above score dict
-    # sorted in ascending order (lowest score first)
-    # NOTE: this is bad practice but it is accessed in the global scope
-    global SORTED_GUESSES
-    SORTED_GUESSES = mean_part_df.sort_values("mean_partition")["word_index"].values
-
-    possible_answers = set([i for i in range(len(answer_words))])
+    ctx = make_search_context(dictionary, max_depth, find_optimal=find_optimal, hard_mode=hard_mode)
+    if checkpoint or resume:
+        # (a resumed search keeps saving its progress, in case it gets killed again)
+        ctx.use_checkpoints = True
+    guess_words = ctx.guess_words
+    answer_words = ctx.answer_words
 
     try:
         root_word_index = guess_words.index(first_word)
@@ -888,53 +1532,57 @@ def solve(dictionary: str, first_word: str, max_depth: int, find_optimal: bool =
         logging.error("First word %s is not in the list of guess words", first_word)
         raise e
 
-    # set optimization options based on the dictionary
-    if dictionary == "answers":
-        global IS_DEBUG
-        IS_DEBUG = False
-        global PROGRESS_LOG_LEVEL
-        PROGRESS_LOG_LEVEL = logging.DEBUG
-        if EXIT_ON_FIRST_SOLUTION:
-            global USE_TQDM_LOW_DEPTHS
-            USE_TQDM_LOW_DEPTHS = False
-        if MAX_DEPTH == 6 and EXIT_ON_FIRST_SOLUTION:
-            global USE_OPT_4
-            USE_OPT_4 = False
-            pass
-        global IS_TIMING_ENABLED
-        IS_TIMING_ENABLED = False
-        global USE_CHECKPOINTS
-        USE_CHECKPOINTS = False
-
-    if not USE_OPT_4:
+    if not ctx.use_opt_4:
         logging.info("OPT_4 is disabled")
 
+    out_path = get_tree_out_path(dictionary, first_word, hard_mode)
+
+    if time_budget is not None:
+        if tree is None:
+            print("Building starting tree...")
+            # the anytime search needs a complete tree to improve on, so find one the quick way first
+            ctx.exit_on_first_solution = True
+            transpositions = ctx.transpositions
+            ctx.transpositions = None
+            tree_checkpoint = make_checkpoint(ctx, dictionary, first_word, resume)
+            tree, found_words, tree_size, _ = build_tree(ctx, root_word_index, None, dictionary, jobs, tree_checkpoint)
+            ctx.exit_on_first_solution = False
+            ctx.transpositions = transpositions
+            if tree_checkpoint is not None:
+                tree_checkpoint.remove()
+            if len(found_words) < len(answer_words):
+                raise Exception(f"Could not find a starting tree for {first_word} with max depth {max_depth}")
+        elif jobs > 1:
+            logging.warning("The anytime search improves one partition at a time, so it doesn't use the other jobs")
+        print(f"Improving tree for {time_budget:.0f} seconds...")
+        tree, tree_size = optimize_tree(tree, ctx, time_budget, out_path)
+        print(f"Tree size: {tree_size}")
+        print(f"Wrote tree to {out_path}")
+        return
+
     print("Building tree...")
-    tree, found_words, tree_size, num_states_opened = construct_tree(
-        guesses=[root_word_index],
-        guess_results=[],
-        table=table,
-        depth=1,
-        possible_answers=possible_answers,
-        tree=tree,
-    )
+    tree_checkpoint = make_checkpoint(ctx, dictionary, first_word, resume, tree_file)
+    tree, found_words, tree_size, num_states_opened = build_tree(ctx, root_word_index, tree, dictionary, jobs, tree_checkpoint)
 
     print("Decision tree has been built")
     print(f"Tree size: {tree_size}")
     print(f"# states opened: {num_states_opened:,}")
+    if ctx.transpositions is not None and jobs == 1:
+        # (the workers each have their own table)
+        print(f"# transposition table hits: {ctx.transpositions.num_hits:,} (misses: {ctx.transpositions.num_misses:,})")
     print("Found %d / %d words" % (len(found_words), len(answer_words)))
     if len(found_words) == len(answer_words):
         print("Success! Decision tree is full!")
 
-    out_path = f"out/decision-trees/{dictionary}/{first_word}.json"
-    # this will make sure we don't overwrite any existing files
-    i = 0
-    while os.path.exists(out_path):
-        i += 1
-        out_path = f"out/decision-trees/{dictionary}/{first_word}-{i}.json"
+    if tree_checkpoint is not None:
+        # the search ran to the end, so there's nothing left to resume
+        tree_checkpoint.remove()
+    if hard_mode and len(found_words) < len(answer_words):
+        # the search stops at the first partition it can't solve, so the rest of the tree is missing too
+        # (this is not a bug: with only the hints allowed, some partitions can't be split in time)
+        raise Exception(f"Could not find a full hard mode tree for {first_word} with max depth {max_depth}. Not writing it")
 
-    with open(out_path, "w") as out_fp:
-        json.dump(tree, out_fp, indent=4, sort_keys=True)
+    write_tree(tree, out_path)
     print(f"Wrote tree to {out_path}")
 
 
@@ -1012,6 +1660,35 @@ if __name__ == "__main__":
         "--tree-file",
         help="Optionally provide a previously computed tree file for this guess"
     )
+    parser.add_argument(
+        "--hard-mode",
+        action="store_true",
+        help="Build a tree for hard mode: every guess after the first has to use all the hints revealed so far",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes. With --find-optimal, the subtrees for each result of the first word are solved in parallel. "
+        "Ignored otherwise: the first-solution search is too quick for the pool to pay off",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=None,
+        help="With --find-optimal, improve the tree (from --tree-file, or a quickly found one) for this many seconds. The best tree so far is written out as we go",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="Save each solved result of the first word under cache/tree-checkpoints/, so that the search can be resumed with --resume if it gets killed",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Pick up a search that was killed (run with --checkpoint): skip the results of the first word it already solved (with the same dictionary, table, first word, tree file and settings)",
+    )
     args = parser.parse_args()
 
     first_word = DEFAULT_ROOT_WORD
@@ -1029,5 +1706,10 @@ if __name__ == "__main__":
         max_depth=args.max_depth,
         find_optimal=args.find_optimal,
         tree_file=args.tree_file,
+        hard_mode=args.hard_mode,
+        jobs=args.jobs,
+        time_budget=args.time_budget,
+        checkpoint=args.checkpoint,
+        resume=args.resume,
     )
     # solve_all_cheating()
@@ -0,0 +1,124 @@
+"""
+Streaming storage for solver evaluation results.
+
+Every finished game is appended to a JSONL file as soon as it is done, one record per line:
+    {"answer": ..., "is_solved": ..., "num_guesses": ..., "guesses": [...]}
+so an interrupted run loses at most the game in progress, and can be resumed from the file.
+The summary statistics are accumulated one record at a time, so memory stays flat no matter how many results there are.
+"""
+
+import json
+import os
+from typing import IO, Iterator, List, Set
+
+
+def make_eval_record(
+    answer: str, is_solved: bool, num_guesses: int, guesses: List[str]
+) -> dict:
+    return {
+        "answer": answer,
+        "is_solved": is_solved,
+        "num_guesses": num_guesses,
+        "guesses": guesses,
+    }
+
+
+def read_eval_results(path: str) -> Iterator[dict]:
+    """
+    Yield every record in the file, in the order they were written
+    A half-written last line (from a run which was killed) is skipped
+    """
+    with open(path) as fp:
+        for line in fp:
+            if not line.endswith("\n"):
+                break
+            yield json.loads(line)
+
+
+def get_recorded_answers(path: str) -> Set[str]:
+    """Return the answers which already have a result in the file"""
+    if not os.path.exists(path):
+        return set([])
+    return set([record["answer"] for record in read_eval_results(path)])
+
+
+def open_eval_results(path: str, resume: bool) -> IO[str]:
+    """
+    Open the results file for appending
+    :param resume:  If true, keep the results already in the file (dropping a half-written last line, if any).
+                    Otherwise start from an empty file
+    """
+    if resume and os.path.exists(path):
+        # rewrite the complete records so the next one starts on a fresh line
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as fp:
+            for record in read_eval_results(path):
+                fp.write(json.dumps(record) + "\n")
+        os.replace(tmp_path, path)
+        return open(path, "a")
+    return open(path, "w")
+
+
+def write_eval_result(fp: IO[str], record: dict) -> None:
+    # flush every record so that a crash doesn't lose it
+    fp.write(json.dumps(record) + "\n")
+    fp.flush()
+
+
+class EvalSummary:
+    """Summary statistics over a stream of results"""
+
+    def __init__(self):
+        self.num_puzzles = 0
+        self.num_solved = 0
+        self.total_guesses = 0
+
+    def add(self, record: dict) -> None:
+        self.num_puzzles += 1
+        self.num_solved += int(record["is_solved"])
+        self.total_guesses += record["num_guesses"]
+
+    @property
+    def num_unsolved(self) -> int:
+        return self.num_puzzles - self.num_solved
+
+    @property
+    def mean_guesses(self) -> float:
+        return self.total_guesses / self.num_puzzles
+
+    def print(self) -> None:
+        print(f"Mean # of guesses per puzzle: {self.mean_guesses:.2f}")
+        print(
+            f"# puzzles solved: {self.num_solved} ({self.num_solved / self.num_puzzles * 100:.1f}%)"
+        )
+        print(
+            f"# puzzles unsolved: {self.num_unsolved} ({self.num_unsolved / self.num_puzzles * 100:.1f})%"
+        )
+
+
+def write_eval_json(path: str, results_path: str, info: dict) -> EvalSummary:
+    """
+    Write the results file as a single JSON object: the keys in info, plus a "per_word_results" map from answer to result
+    The records are copied over one at a time, so they are never all in memory at once
+    Return the summary of the results
+    """
+    summary = EvalSummary()
+    with open(path, "w") as fp:
+        fp.write("{\n")
+        for key in sorted(info.keys()):
+            fp.write(f"    {json.dumps(key)}: {json.dumps(info[key])},\n")
+        fp.write('    "per_word_results": {')
+        for i, record in enumerate(read_eval_results(results_path)):
+            summary.add(record)
+            answer = record.pop("answer")
+            fp.write("\n" if i == 0 else ",\n")
+            fp.write(f"        {json.dumps(answer)}: {json.dumps(record, sort_keys=True)}")
+        fp.write("\n    }\n}\n")
+    return summary
+
+
+def summarize_eval_results(path: str) -> EvalSummary:
+    summary = EvalSummary()
+    for record in read_eval_results(path):
+        summary.add(record)
+    return summary
@@ -0,0 +1,65 @@
+"""
+Hard mode: every guess after the first has to use the hints revealed so far.
+    - a letter in the right place (green) has to be reused in the same place
+    - a letter in the wrong place (yellow) has to be reused somewhere
+
+The constraint from each (guess, result) pair is computed for every guess word at once from the letter array,
+and the constraints from the guesses so far are and-ed together.
+"""
+
+import functools
+from typing import List
+
+import numpy as np
+
+from play import RIGHT_PLACE, WRONG_PLACE
+from possibilities_table import (
+    integer_to_arr,
+    letter_array_to_masks,
+    words_to_letter_array,
+)
+
+# how many (guess, result) constraints to keep around. Each one is a bool per guess word
+CONSTRAINT_CACHE_SIZE = 4096
+
+
+class HardModeFilter:
+    def __init__(self, guess_words: List[str]):
+        """
+        :param guess_words: The words which can be guessed. The filter returns one bool per word
+        """
+        self.guess_words = guess_words
+        self.letters = words_to_letter_array(guess_words)
+        self.masks = letter_array_to_masks(self.letters)
+        self.get_constraint = functools.lru_cache(maxsize=CONSTRAINT_CACHE_SIZE)(
+            self._get_constraint
+        )
+
+    def _get_constraint(self, guess: int, result: int) -> np.ndarray:
+        """
+        Return a (read-only) bool array: which guess words use all the hints from guessing `guess` and getting `result`
+        """
+        allowed = np.ones(len(self.guess_words), dtype=bool)
+        required_mask = 0
+        for i, val in enumerate(integer_to_arr(result)):
+            letter = self.letters[guess, i]
+            if val == RIGHT_PLACE:
+                allowed &= self.letters[:, i] == letter
+            elif val == WRONG_PLACE:
+                required_mask |= 1 << int(letter)
+        if required_mask:
+            allowed &= (self.masks & required_mask) == required_mask
+        allowed.flags.writeable = False
+        return allowed
+
+    def get_allowed(self, guesses: List[int], guess_results: List[int]) -> np.ndarray:
+        """
+        Return a bool array with one entry per guess word: whether it can be guessed next
+        :param guesses:         The guesses so far (as indexes into guess_words)
+        :param guess_results:   The result for each of those guesses
+        """
+        assert len(guesses) == len(guess_results)
+        allowed = np.ones(len(self.guess_words), dtype=bool)
+        for guess, result in zip(guesses, guess_results):
+            allowed &= self.get_constraint(int(guess), int(result))
+        return allowed
@@ -0,0 +1,131 @@
+"""
+An opening book: the solver's next guess for every response to the first guess, and to the second guess.
+
+The book is built offline for a first word and strategy by walking the solver's decision tree down to BOOK_DEPTH guesses.
+Interactive mode then looks up the second and third guesses instead of scoring every candidate while the user waits,
+and only falls back to computing the guess for deeper states.
+The book is keyed by the content hash of the table it was built from, so a rebuilt table makes it stale.
+"""
+
+import logging
+import os.path
+from typing import Optional
+
+import numpy as np
+from tqdm import tqdm
+
+from partition_scores import get_strategy_scores
+from possibilities_table import integer_to_arr
+from solver_state import GuessMemo, SolverSession, SolverState
+
+BOOK_DIR = "data-parsed/opening-books"
+# number of guesses covered by the book (including the first word)
+BOOK_DEPTH = 3
+
+ALL_LETTERS_CORRECT = (3 ** 5) - 1
+
+
+def get_book_path(strategy: str, first_word: str, hard_mode: bool) -> str:
+    mode = "-hard-mode" if hard_mode else ""
+    return os.path.join(BOOK_DIR, f"opening-book-{strategy}-{first_word}{mode}.json")
+
+
+def get_book_meta(session: SolverSession, strategy: str, first_word: str) -> dict:
+    return {
+        "table_hash": session.content_hash,
+        "strategy": strategy,
+        "first_word": first_word,
+        "hard_mode": session.hard_mode,
+    }
+
+
+def _add_to_book(
+    book: GuessMemo, state: SolverState, guess: str, strategy: str, num_guesses: int
+) -> None:
+    """
+    Add the solver's next guess for every possible response to `guess`, and recurse until the book covers BOOK_DEPTH guesses
+    :param state:       The state before `guess` is made
+    :param num_guesses: The number of guesses made so far, including `guess`
+    """
+    row = state.table[state.guess_indexes[guess]]
+    results = np.unique(row[state.remaining])
+    # the first level is where all the time goes, so show progress over it
+    results_it = tqdm(results) if num_guesses == 1 else results
+    for result in results_it:
+        if result == ALL_LETTERS_CORRECT:
+            continue
+        next_state = state.copy()
+        next_state.prune(guess, integer_to_arr(int(result)))
+        scores = get_strategy_scores(next_state.score_candidate_guesses(), strategy)
+        next_guess = next_state.pick_next_guess(scores)
+        book.put(next_state.get_history(), next_guess)
+        if num_guesses + 1 < BOOK_DEPTH:
+            _add_to_book(book, next_state, next_guess, strategy, num_guesses + 1)
+
+
+def build_opening_book(
+    session: SolverSession, strategy: str, first_word: str
+) -> GuessMemo:
+    book = GuessMemo()
+    _add_to_book(book, session.new_game(), first_word, strategy, 1)
+    return book
+
+
+def save_opening_book(
+    book: GuessMemo, session: SolverSession, strategy: str, first_word: str
+) -> str:
+    os.makedirs(BOOK_DIR, exist_ok=True)
+    path = get_book_path(strategy, first_word, session.hard_mode)
+    book.save(path, get_book_meta(session, strategy, first_word))
+    return path
+
+
+def load_opening_book(
+    session: SolverSession, strategy: str, first_word: str
+) -> Optional[GuessMemo]:
+    """Return None if there is no book for this first word and strategy, or if it was built from a different table"""
+    path = get_book_path(strategy, first_word, session.hard_mode)
+    if session.content_hash is None or not os.path.exists(path):
+        return None
+    book = GuessMemo.load(path, get_book_meta(session, strategy, first_word))
+    if len(book) == 0:
+        logging.warning("Opening book %s is stale. Not using it", path)
+        return None
+    return book
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    from partition_scores import STRATEGIES
+    from solver import FIRST_GUESS_WORD, load_solver_session
+
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-f",
+        "--first-word",
+        type=str,
+        help="The first word to guess",
+        default=FIRST_GUESS_WORD,
+    )
+    parser.add_argument(
+        "-t",
+        "--strategy",
+        choices=list(STRATEGIES.keys()),
+        default="worst_partition",
+        help="The strategy used to pick the next guesses",
+    )
+    parser.add_argument(
+        "--hard-mode",
+        action="store_true",
+        help="Build the book for hard mode",
+    )
+    args = parser.parse_args()
+
+    session = load_solver_session([], hard_mode=args.hard_mode)
+    if args.first_word not in session.guess_indexes:
+        print(f"ERROR: first word {args.first_word} is not a valid guess")
+        exit(1)
+    book = build_opening_book(session, args.strategy, args.first_word)
+    path = save_opening_book(book, session, args.strategy, args.first_word)
+    print(f"Saved {len(book)} positions to {path}")
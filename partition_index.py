@@ -0,0 +1,147 @@
+"""
+An inverted index over the possibilities table.
+
+For every guess, the answers are grouped by the response they give to that guess.
+The groups are stored in CSR form:
+    - answer_ids[guess] holds every answer id, sorted by (response, answer id)
+    - offsets[guess, result] is where the answers with that response start in answer_ids[guess]
+    - offsets[guess, result + 1] is where they stop
+
+So the answers for a (guess, result) pair are a slice of size k, rather than a scan over the whole row.
+The index is saved next to the table file and memory-mapped when loaded.
+"""
+
+import functools
+import os.path
+from typing import Optional
+
+import numpy as np
+from tqdm import tqdm
+
+from answer_set import AnswerSet
+from possibilities_table import TABLE_FILE_PATHS, PossibilitiesTable, load_possibilities
+from table_file import read_table_file, write_table_file
+
+NUM_RESULTS = 3 ** 5
+
+# number of guess rows indexed at a time
+INDEX_BLOCK_SIZE = 1024
+
+# how many (guess, result) answer sets to keep around
+ANSWER_SET_CACHE_SIZE = 1 << 16
+
+
+class PartitionIndex:
+    def __init__(self, offsets: np.ndarray, answer_ids: np.ndarray, table_hash: str):
+        """
+        :param offsets:     (num_guesses, NUM_RESULTS + 1) array of offsets into each row of answer_ids
+        :param answer_ids:  (num_guesses, num_answers) array. Each row is sorted by (response, answer id)
+        :param table_hash:  content hash of the table this index was built from
+        """
+        self.offsets = offsets
+        self.answer_ids = answer_ids
+        self.table_hash = table_hash
+        # the search asks for the same (guess, result) pairs over and over
+        self.get_answer_set = functools.lru_cache(maxsize=ANSWER_SET_CACHE_SIZE)(
+            self._get_answer_set
+        )
+
+    def get_answers(self, guess: int, result: int) -> np.ndarray:
+        """Return the (sorted) ids of all the answers which give this result for this guess"""
+        offsets = self.offsets[guess]
+        return self.answer_ids[guess, offsets[result] : offsets[result + 1]]
+
+    def _get_answer_set(self, guess: int, result: int) -> AnswerSet:
+        """Same as get_answers but return the answers as an AnswerSet"""
+        return AnswerSet.from_ids(self.get_answers(guess, result))
+
+    def get_partition_sizes(self, guess: int) -> np.ndarray:
+        """Return the number of answers for each of the NUM_RESULTS possible results of this guess"""
+        return np.diff(self.offsets[guess])
+
+
+def get_index_path(table_path: str) -> str:
+    base, _ = os.path.splitext(table_path)
+    return base + "-partition-index.table"
+
+
+def build_partition_index(
+    table: np.ndarray, table_hash: str, block_size: int = INDEX_BLOCK_SIZE
+) -> PartitionIndex:
+    num_guesses, num_answers = table.shape
+    id_dtype = np.int16 if num_answers <= np.iinfo(np.int16).max else np.int32
+    offsets = np.zeros(shape=(num_guesses, NUM_RESULTS + 1), dtype=np.int32)
+    answer_ids = np.empty(shape=(num_guesses, num_answers), dtype=id_dtype)
+
+    for start in tqdm(range(0, num_guesses, block_size)):
+        stop = min(start + block_size, num_guesses)
+        block = table[start:stop]
+        # a stable sort keeps the answer ids in ascending order within each response
+        answer_ids[start:stop] = np.argsort(block, axis=1, kind="stable")
+        # count every (row, result) pair with a single bincount
+        flat = np.arange(stop - start)[:, np.newaxis] * NUM_RESULTS + block
+        counts = np.bincount(
+            flat.ravel(), minlength=(stop - start) * NUM_RESULTS
+        ).reshape(stop - start, NUM_RESULTS)
+        np.cumsum(counts, axis=1, out=offsets[start:stop, 1:])
+
+    return PartitionIndex(offsets, answer_ids, table_hash)
+
+
+def save_partition_index(path: str, index: PartitionIndex) -> None:
+    write_table_file(
+        path,
+        arrays={"offsets": index.offsets, "answer_ids": index.answer_ids},
+        meta={"table_hash": index.table_hash},
+    )
+
+
+def load_partition_index(
+    possibilities: PossibilitiesTable, path: Optional[str] = None
+) -> PartitionIndex:
+    """
+    Memory-map the index for this table.
+    If it doesn't exist yet, or was built from a different table, (re)build it and save it to path first.
+    """
+    if path is not None and os.path.exists(path):
+        arrays, meta = read_table_file(path)
+        if meta["table_hash"] == possibilities.content_hash:
+            return PartitionIndex(
+                arrays["offsets"], arrays["answer_ids"], meta["table_hash"]
+            )
+        print(f"Partition index {path} is stale")
+
+    print("Building partition index...")
+    index = build_partition_index(possibilities.table, possibilities.content_hash)
+    if path is not None:
+        save_partition_index(path, index)
+        print(f"Saved partition index to {path}")
+        # re-open it so that it's memory-mapped like it would be next time
+        return load_partition_index(possibilities, path)
+    return index
+
+
+def load_dictionary_partition_index(
+    dictionary: str, possibilities: Optional[PossibilitiesTable] = None
+) -> PartitionIndex:
+    """Load the index stored next to the table file for this dictionary"""
+    if possibilities is None:
+        possibilities = load_possibilities(dictionary)
+    return load_partition_index(
+        possibilities, get_index_path(TABLE_FILE_PATHS[dictionary])
+    )
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-d",
+        "--dictionary",
+        choices=list(TABLE_FILE_PATHS.keys()),
+        required=True,
+        help="Build the partition index for the table of this dictionary",
+    )
+    args = parser.parse_args()
+    load_dictionary_partition_index(args.dictionary)
@@ -0,0 +1,166 @@
+"""
+Vectorized partition scoring.
+
+Every guess splits the remaining answers into (at most) 243 partitions, one per response.
+Rather than looping over the guesses in Python, we compute the whole (num_guesses x 243) histogram of
+partition sizes with a single bincount over the flattened submatrix, and derive all the scores from it.
+"""
+
+from functools import cached_property
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+NUM_RESULTS = 3 ** 5
+
+# upper bound on the number of table cells we gather at a time when computing a histogram
+# keeps the temporary arrays to a few tens of MB no matter how many answers remain
+MAX_BLOCK_CELLS = 1 << 22
+
+
+class PartitionScores:
+    """
+    All the partition scores for a set of guesses, computed from a (num_guesses, NUM_RESULTS) histogram
+    Each score is an array with one entry per guess, and is only computed the first time it is used.
+    Lower is better for every score except entropy and partition_count
+    """
+
+    def __init__(self, hist: np.ndarray):
+        self.hist = hist
+
+    @cached_property
+    def num_answers(self) -> np.ndarray:
+        return self.hist.sum(axis=1)
+
+    @cached_property
+    def worst_partition(self) -> np.ndarray:
+        """Size of the largest partition"""
+        return self.hist.max(axis=1)
+
+    @cached_property
+    def partition_count(self) -> np.ndarray:
+        """Number of non-empty partitions"""
+        return np.count_nonzero(self.hist, axis=1)
+
+    @cached_property
+    def mean_partition(self) -> np.ndarray:
+        """Mean size of the non-empty partitions"""
+        return self.num_answers / np.maximum(self.partition_count, 1)
+
+    @cached_property
+    def expected_size(self) -> np.ndarray:
+        """Expected size of the partition the answer ends up in, if every answer is equally likely"""
+        hist = self.hist
+        return (hist * hist).sum(axis=1) / np.maximum(self.num_answers, 1)
+
+    @cached_property
+    def entropy(self) -> np.ndarray:
+        """Entropy (in bits) of the response"""
+        p = self.hist / np.maximum(self.num_answers, 1)[:, np.newaxis]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return -np.where(self.hist > 0, p * np.log2(p), 0.0).sum(axis=1)
+
+
+def compute_partition_histogram(
+    table: np.ndarray,
+    answer_ids: np.ndarray,
+    guess_ids: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Return a (num_guesses, NUM_RESULTS) array where element (i, r) is the number of answers in answer_ids
+    which give result r for guess i
+    :param guess_ids: The guesses (rows) to score. By default, score every row of the table
+    """
+    num_guesses = table.shape[0] if guess_ids is None else len(guess_ids)
+    hist = np.empty(shape=(num_guesses, NUM_RESULTS), dtype=np.int64)
+    if num_guesses == 0:
+        return hist
+    block_size = max(1, MAX_BLOCK_CELLS // max(1, len(answer_ids)))
+
+    for start in range(0, num_guesses, block_size):
+        stop = min(start + block_size, num_guesses)
+        if guess_ids is None:
+            rows = table[start:stop]
+        else:
+            rows = table[guess_ids[start:stop]]
+        sub = rows[:, answer_ids]
+        # offset each row into its own range of NUM_RESULTS bins so one bincount counts every row
+        flat = sub + (np.arange(stop - start) * NUM_RESULTS)[:, np.newaxis]
+        hist[start:stop] = np.bincount(
+            flat.ravel(), minlength=(stop - start) * NUM_RESULTS
+        ).reshape(stop - start, NUM_RESULTS)
+    return hist
+
+
+def score_guesses(
+    table: np.ndarray,
+    answer_ids: np.ndarray,
+    guess_ids: Optional[np.ndarray] = None,
+) -> PartitionScores:
+    """Score every guess (or just guess_ids) against the remaining answers in one vectorized pass"""
+    return PartitionScores(compute_partition_histogram(table, answer_ids, guess_ids))
+
+
+
+def score_guesses_batch(
+    table: np.ndarray, queries: List[Tuple[np.ndarray, np.ndarray]]
+) -> List[PartitionScores]:
+    """
+    Score several independent (answer_ids, guess_ids) queries
+    The small queries are packed together and counted with a single bincount, so a batch of small states
+    costs about the same as one. Queries bigger than MAX_BLOCK_CELLS are scored on their own
+    """
+    out = [None] * len(queries)  # type: List[Optional[PartitionScores]]
+    # (query position, offset rows) for the queries in the current pack
+    pack = []  # type: List[Tuple[int, np.ndarray]]
+    pack_rows = 0
+    pack_cells = 0
+
+    def flush():
+        nonlocal pack, pack_rows, pack_cells
+        if pack:
+            flat = np.concatenate([rows.ravel() for _, rows in pack])
+            hist = np.bincount(flat, minlength=pack_rows * NUM_RESULTS).reshape(
+                pack_rows, NUM_RESULTS
+            )
+            start = 0
+            for q, rows in pack:
+                out[q] = PartitionScores(hist[start : start + rows.shape[0]])
+                start += rows.shape[0]
+        pack = []
+        pack_rows = 0
+        pack_cells = 0
+
+    for q, (answer_ids, guess_ids) in enumerate(queries):
+        cells = len(answer_ids) * len(guess_ids)
+        if cells > MAX_BLOCK_CELLS:
+            out[q] = score_guesses(table, answer_ids, guess_ids)
+            continue
+        if pack_cells + cells > MAX_BLOCK_CELLS:
+            flush()
+        sub = table[guess_ids][:, answer_ids].astype(np.int64)
+        # same trick as compute_partition_histogram, but the rows of every query in the pack get their own bins
+        sub += ((pack_rows + np.arange(len(guess_ids))) * NUM_RESULTS)[:, np.newaxis]
+        pack.append((q, sub))
+        pack_rows += len(guess_ids)
+        pack_cells += cells
+    flush()
+    return out  # type: ignore
+
+
+# name -> function returning one score per guess. Lower is better for every strategy,
+# so the scores which should be maximized are negated
+STRATEGIES = {
+    "worst_partition": lambda scores: scores.worst_partition,
+    "mean_partition": lambda scores: scores.mean_partition,
+    "entropy": lambda scores: -scores.entropy,
+    "expected_size": lambda scores: scores.expected_size,
+    "partition_count": lambda scores: -scores.partition_count,
+}
+
+
+def get_strategy_scores(scores: PartitionScores, strategy: str) -> np.ndarray:
+    """Return the score of each guess under this strategy (lower is better)"""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy}. Must be one of {', '.join(STRATEGIES.keys())}")
+    return STRATEGIES[strategy](scores)
@@ -2,10 +2,12 @@
 This file will build the possibilities matrix
 """
 
-import itertools
+import hashlib
+import json
+import multiprocessing
+import os
 import os.path
-import pickle
-from typing import List, Optional, Tuple
+from typing import List, NamedTuple, Optional, Set, Tuple
 
 import numpy as np
 import pandas as pd
@@ -19,57 +21,66 @@ TABLE_DF_PATH = os.path.join(
 TABLE_PATH_ASYMMETRIC = os.path.join(
     BASE_DIR, "data-parsed/possibilities-table-asymmetric-base-3.npy"
 )
-TABLE_PATH_CHEATING = "./data-parsed/possibilities-table-cheating-base-3.npy"
+TABLE_PATH_CHEATING = os.path.join(
+    BASE_DIR, "data-parsed/possibilities-table-cheating-base-3.npy"
+)
+# map from dictionary name (as used by the solvers) to the .npy table for that dictionary
+# these are no longer written, but --pack-only converts them into table files
+TABLE_PATHS = {
+    "full": TABLE_PATH,
+    "asymmetric": TABLE_PATH_ASYMMETRIC,
+    "answers": TABLE_PATH_CHEATING,
+}
+# the self-describing table files (see table_file.py). These embed the guess and answer words
+TABLE_FILE_PATHS = {
+    "full": os.path.join(BASE_DIR, "data-parsed/possibilities-table-base-3.table"),
+    "asymmetric": os.path.join(
+        BASE_DIR, "data-parsed/possibilities-table-asymmetric-base-3.table"
+    ),
+    "answers": os.path.join(
+        BASE_DIR, "data-parsed/possibilities-table-cheating-base-3.table"
+    ),
+}
+
+# number of guess rows computed at a time by the vectorized builder
+# each block needs a few (BLOCK_SIZE x num_answers) temporary arrays, so keep this modest
+BLOCK_SIZE = 512
 
 
 from parse_data import read_all_answers, read_parsed_words
-from play import LETTER_ABSENT, RIGHT_PLACE, WRONG_PLACE, UNSAFE_eval_guess
+from play import LETTER_ABSENT, RIGHT_PLACE, WRONG_PLACE
+from response_codec import (
+    decode_response,
+    encode_response,
+    response_from_string,
+    response_to_string,
+)
+from table_file import read_table_file, write_table_file
+
 
+class PossibilitiesTable(NamedTuple):
+    """
+    A possibilities table together with the words for its rows and columns
+    table[i, j] is the response when guessing guess_words[i] and the answer is answer_words[j]
+    """
 
-def integer_to_arr(rval: int):
-    arr = [0] * 5
-    for i in range(5, -1, -1):
-        # the number at position i
-        # should be a value between 0-3
-        if rval >= (3 ** i):
-            rem = rval % (3 ** i)
-            pos_value = int((rval - rem) / (3 ** i))
-            arr[i] = pos_value
-            rval -= arr[i] * (3 ** i)
-    return arr
+    table: np.ndarray
+    guess_words: List[str]
+    answer_words: List[str]
+    # identifies the contents of the table. Use this to key anything derived from the table
+    content_hash: str
 
 
-def guess_response_from_string(guess_response: str) -> int:
-    assert len(guess_response) == 5
+def integer_to_arr(rval: int) -> List[int]:
+    return decode_response(rval)
 
-    def char_to_base_3(s: str) -> int:
-        if s == "G":
-            return RIGHT_PLACE
-        elif s == "Y":
-            return WRONG_PLACE
-        elif s == "B":
-            return LETTER_ABSENT
-        else:
-            raise Exception(s)
 
-    arr = [char_to_base_3(c) for c in guess_response]
-    return array_to_integer(arr)
+def guess_response_from_string(guess_response: str) -> int:
+    return response_from_string(guess_response)
 
 
 def guess_response_to_string(rval: int) -> str:
-    def base_3_to_char(val: int) -> str:
-        if val == RIGHT_PLACE:
-            return "G"
-        elif val == WRONG_PLACE:
-            return "Y"
-        elif val == LETTER_ABSENT:
-            return "B"
-        else:
-            raise Exception(val)
-
-    arr = integer_to_arr(rval)
-    chars = map(base_3_to_char, arr)
-    return "".join(chars)
+    return response_to_string(rval)
 
 
 def array_to_integer(array: List[int]) -> int:
@@ -79,29 +90,88 @@ def array_to_integer(array: List[int]) -> int:
     0 denotes absence
     we will convert this to an integer
     This integer is guaranteed to be between 0 and 3**5
+    (see response_codec.py for the encoding)
+    """
+    return encode_response(array)
+
+
+def load_table_path(path: str) -> np.ndarray:
+    """
+    Memory-map the .npy table at this path read-only.
+    Nothing is read into private memory, so every process using the same table shares the OS page cache.
     """
-    assert isinstance(array, list)
-    assert len(array) == 5
-    v = 0
-    for i, pos_value in enumerate(array):
-        assert pos_value < 3 and pos_value >= 0
-        v += (3 ** i) * pos_value
-    assert v < 255
-    return v
+    table = np.load(path, mmap_mode="r")
+    # a plain ndarray view over the mapping avoids the np.memmap subclass overhead on every slice
+    return np.asarray(table)
 
 
-def load_possibilities_table(words: List[str]) -> pd.DataFrame:
+def save_table_file(
+    path: str, table: np.ndarray, guess_words: List[str], answer_words: List[str]
+) -> str:
+    """
+    Save the table along with its guess and answer words (as fixed-width bytes) in a single file
+    Return the content hash
+    """
+    assert table.shape == (len(guess_words), len(answer_words))
+    return write_table_file(
+        path,
+        arrays={
+            "table": table,
+            "guess_words": np.array(guess_words, dtype="S5"),
+            "answer_words": np.array(answer_words, dtype="S5"),
+        },
+        meta={"shape": list(table.shape)},
+    )
+
+
+def load_table_file(path: str) -> PossibilitiesTable:
+    """
+    Memory-map a table file written by save_table_file
+    The words are part of the same file, so they always match the table
+    """
+    arrays, meta = read_table_file(path)
+    return PossibilitiesTable(
+        table=arrays["table"],
+        guess_words=arrays["guess_words"].astype("U5").tolist(),
+        answer_words=arrays["answer_words"].astype("U5").tolist(),
+        content_hash=meta["content_hash"],
+    )
+
+
+def load_possibilities(dictionary: str) -> PossibilitiesTable:
+    """
+    This is how every consumer should load a possibilities table
+    :param dictionary: One of the keys in TABLE_FILE_PATHS
+    """
+    if dictionary not in TABLE_FILE_PATHS:
+        raise Exception(dictionary)
+    return load_table_file(TABLE_FILE_PATHS[dictionary])
+
+
+def load_table(dictionary: str) -> np.ndarray:
+    """Same as above but only return the table itself"""
+    return load_possibilities(dictionary).table
+
+
+def load_possibilities_table(
+    words: List[str], path: Optional[str] = None
+) -> pd.DataFrame:
     """
     Return a dataframe
     The index will represent guesses
     The columns will represent answers
+    The dataframe is backed by the read-only memory-mapped table (see load_table_path)
+    :param path: May optionally specify a path to a .npy table
     """
-    table = np.load(TABLE_PATH)  # type: np.ndarray
-    return pd.DataFrame(table, index=words, columns=words)
+    if path is None:
+        path = TABLE_PATH
+    table = load_table_path(path)
+    return pd.DataFrame(table, index=words, columns=words, copy=False)
 
 
 def load_possibilities_table_df(path: Optional[str] = None) -> pd.DataFrame:
-    """Same as above but will load the dataframe directly
+    """Same as above but will load the dataframe directly from a parquet file
+    NOTE: this has to decompress the whole table into memory. Prefer load_possibilities_table
     :param path: May optionally specify a path
     """
     if path is None:
@@ -109,26 +179,95 @@ def load_possibilities_table_df(path: Optional[str] = None) -> pd.DataFrame:
     return pd.read_parquet(path)
 
 
+def words_to_letter_array(words: List[str]) -> np.ndarray:
+    """
+    Encode a list of 5-letter lowercase words as a (N, 5) uint8 array
+    Each letter is stored as its index in the alphabet (a = 0, z = 25)
+    """
+    buf = "".join(words).encode("ascii")
+    letters = np.frombuffer(buf, dtype=np.uint8).reshape(len(words), 5)
+    return letters - ord("a")
+
+
+def letter_array_to_masks(letters: np.ndarray) -> np.ndarray:
+    """
+    Convert a (N, 5) letter array into N 26-bit masks
+    Bit i is set iff the word contains the letter with index i
+    """
+    masks = np.zeros(letters.shape[0], dtype=np.int32)
+    for i in range(5):
+        masks |= np.left_shift(1, letters[:, i].astype(np.int32))
+    return masks
+
+
+def compute_possibilities_block(
+    guess_letters: np.ndarray, answer_letters: np.ndarray
+) -> np.ndarray:
+    """
+    Vectorized version of UNSAFE_eval_guess + array_to_integer
+    Compute the base-3 response for every (guess, answer) pair in one go
+
+    :param guess_letters:   (num_guesses, 5) letter array (see words_to_letter_array)
+    :param answer_letters:  (num_answers, 5) letter array
+    Return a (num_guesses, num_answers) uint8 array
+    """
+    answer_masks = letter_array_to_masks(answer_letters)
+    block = np.zeros(
+        shape=(guess_letters.shape[0], answer_letters.shape[0]), dtype="uint8"
+    )
+    for i in range(5):
+        # the letter at position i of every guess, as a column vector
+        guess_letter = guess_letters[:, i, np.newaxis].astype(np.int32)
+        is_right_place = guess_letter == answer_letters[np.newaxis, :, i]
+        is_in_answer = (np.right_shift(answer_masks, guess_letter) & 1).astype(bool)
+        pos_value = np.where(
+            is_right_place,
+            RIGHT_PLACE,
+            np.where(is_in_answer, WRONG_PLACE, LETTER_ABSENT),
+        ).astype("uint8")
+        # same encoding as array_to_integer
+        block += pos_value * np.uint8(3 ** i)
+    return block
+
+
+def fill_possibilities_table(
+    table: np.ndarray,
+    guess_letters: np.ndarray,
+    answer_letters: np.ndarray,
+    block_size: int = BLOCK_SIZE,
+) -> np.ndarray:
+    """Fill the table in blocks of guess rows. Return the table"""
+    num_guesses = guess_letters.shape[0]
+    for start in tqdm(range(0, num_guesses, block_size)):
+        stop = min(start + block_size, num_guesses)
+        table[start:stop] = compute_possibilities_block(
+            guess_letters[start:stop], answer_letters
+        )
+    return table
+
+
 def compute_possibilities_table(words: List[str]) -> np.ndarray:
     num_words = len(words)
     print(f"computing {num_words}x{num_words} possibilities matrix...")
     table = np.empty(shape=(num_words, num_words), dtype="uint8")
+    letters = words_to_letter_array(words)
+    return fill_possibilities_table(table, letters, letters)
 
-    def f_eval_guess(guess_i: int, answer_i: int) -> int:
-        """Return an integer"""
-        guess = words[guess_i]
-        answer = words[answer_i]
-        rval = UNSAFE_eval_guess(guess=guess, answer=answer)
-        # the numbers are guaranteed to be 0, 1, 2
-        return array_to_integer(rval)
 
-    word_range_1 = np.arange(num_words)
-    word_range_2 = np.arange(num_words)
-    combos = itertools.product(word_range_1, word_range_2)
-    for guess_i, answer_i in tqdm(combos):
-        table[guess_i, answer_i] = f_eval_guess(guess_i, answer_i)
-
-    return table
+def order_asymmetric_guesses(guesses: List[str], answers: List[str]) -> List[str]:
+    """
+    Return the guess words ordered such that guesses[i] == answers[i] for each i < len(answers)
+    NOTE: sorts answers in-place
+    """
+    answers.sort()
+    remaining_words = list(set(guesses) - set(answers))
+    # we want a stable order for these
+    remaining_words.sort()
+    guesses = answers + remaining_words
+    # check that we've achieved our goal
+    for i in range(len(answers)):
+        assert guesses[i] == answers[i]
+    return guesses
 
 
 def compute_possibilities_table_asymmetric(
@@ -140,30 +279,156 @@ def compute_possibilities_table_asymmetric(
     table = np.empty(shape=(num_guesses, num_answers), dtype="uint8")
 
     # we have to do this in a clever way, where guesses[i] == answers[i] for each i < len(answers)
-    answers.sort()
-    remaining_words = list(set(guesses) - set(answers))
-    # we want a stable order for these
-    remaining_words.sort()
-    guesses = answers + remaining_words
-    # check that we've achieved our goal
-    for i in range(len(answers)):
-        assert guesses[i] == answers[i]
+    guesses = order_asymmetric_guesses(guesses, answers)
 
-    def f_eval_guess(guess_i: int, answer_i: int) -> int:
-        """Return an integer"""
-        guess = guesses[guess_i]
-        answer = answers[answer_i]
-        rval = UNSAFE_eval_guess(guess=guess, answer=answer)
-        # the numbers are guaranteed to be 0, 1, 2
-        return array_to_integer(rval)
+    fill_possibilities_table(
+        table, words_to_letter_array(guesses), words_to_letter_array(answers)
+    )
+    return table, guesses, answers
 
-    guess_range = np.arange(num_guesses)
-    answer_range = np.arange(num_answers)
-    combos = itertools.product(guess_range, answer_range)
-    for guess_i, answer_i in tqdm(combos):
-        table[guess_i, answer_i] = f_eval_guess(guess_i, answer_i)
 
-    return table, guesses, answers
+def get_words_digest(guess_words: List[str], answer_words: List[str]) -> str:
+    """Used to make sure we only resume a build with the same word lists"""
+    h = hashlib.sha1()
+    h.update("\n".join(guess_words).encode("ascii"))
+    h.update(b"|")
+    h.update("\n".join(answer_words).encode("ascii"))
+    return h.hexdigest()
+
+
+def read_build_manifest(manifest_path: str, expected: dict) -> Set[int]:
+    """
+    Return the blocks already finished by a previous (interrupted) build
+    If the manifest describes a different build, nothing can be reused
+    """
+    if not os.path.exists(manifest_path):
+        return set([])
+    with open(manifest_path) as fp:
+        manifest = json.load(fp)
+    for key, value in expected.items():
+        if manifest.get(key) != value:
+            print(f"Ignoring stale build manifest {manifest_path} ({key} differs)")
+            return set([])
+    return set(manifest["finished_blocks"])
+
+
+def write_build_manifest(manifest_path: str, build_info: dict, finished_blocks: Set[int]):
+    manifest = dict(build_info)
+    manifest["finished_blocks"] = sorted(finished_blocks)
+    # write to a temporary file first so an interrupt never leaves a corrupt manifest behind
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as fp:
+        json.dump(manifest, fp)
+    os.replace(tmp_path, manifest_path)
+
+
+# these are set once per worker process by _init_build_worker
+_WORKER_TABLE = None  # type: Optional[np.memmap]
+_WORKER_GUESS_LETTERS = None  # type: Optional[np.ndarray]
+_WORKER_ANSWER_LETTERS = None  # type: Optional[np.ndarray]
+_WORKER_BLOCK_SIZE = BLOCK_SIZE
+
+
+def _init_build_worker(
+    partial_path: str,
+    guess_letters: np.ndarray,
+    answer_letters: np.ndarray,
+    block_size: int,
+):
+    global _WORKER_TABLE, _WORKER_GUESS_LETTERS, _WORKER_ANSWER_LETTERS, _WORKER_BLOCK_SIZE
+    _WORKER_TABLE = np.load(partial_path, mmap_mode="r+")
+    _WORKER_GUESS_LETTERS = guess_letters
+    _WORKER_ANSWER_LETTERS = answer_letters
+    _WORKER_BLOCK_SIZE = block_size
+
+
+def _fill_block_worker(block_i: int) -> int:
+    """
+    Compute one block of guess rows and write it straight into the shared output file
+    Only the block number goes back to the parent
+    """
+    assert _WORKER_TABLE is not None
+    assert _WORKER_GUESS_LETTERS is not None and _WORKER_ANSWER_LETTERS is not None
+    start = block_i * _WORKER_BLOCK_SIZE
+    stop = min(start + _WORKER_BLOCK_SIZE, _WORKER_TABLE.shape[0])
+    _WORKER_TABLE[start:stop] = compute_possibilities_block(
+        _WORKER_GUESS_LETTERS[start:stop], _WORKER_ANSWER_LETTERS
+    )
+    _WORKER_TABLE.flush()
+    return block_i
+
+
+def build_possibilities_table_parallel(
+    out_path: str,
+    guess_words: List[str],
+    answer_words: List[str],
+    num_workers: int,
+    block_size: int = BLOCK_SIZE,
+) -> None:
+    """
+    Compute the possibilities table using a pool of worker processes, and save it as a table file at out_path
+    Each worker fills disjoint blocks of guess rows directly into a memory-mapped .npy file next to the output.
+    Finished blocks are recorded in a manifest next to the output file, so if the build is interrupted,
+    running it again will only compute the missing blocks.
+    The table file is only written once every block is done.
+    """
+    partial_path = out_path + ".partial"
+    manifest_path = out_path + ".manifest.json"
+    shape = (len(guess_words), len(answer_words))
+    num_blocks = (shape[0] + block_size - 1) // block_size
+    build_info = {
+        "shape": list(shape),
+        "block_size": block_size,
+        "words_digest": get_words_digest(guess_words, answer_words),
+    }
+
+    finished_blocks = set([])  # type: Set[int]
+    if os.path.exists(partial_path):
+        finished_blocks = read_build_manifest(manifest_path, build_info)
+    if finished_blocks:
+        print(f"Resuming build: {len(finished_blocks)} / {num_blocks} blocks already done")
+    else:
+        # this only creates the (zero-filled) file. The workers open it themselves
+        np.lib.format.open_memmap(partial_path, mode="w+", dtype="uint8", shape=shape)
+        write_build_manifest(manifest_path, build_info, finished_blocks)
+
+    pending_blocks = [i for i in range(num_blocks) if i not in finished_blocks]
+    print(
+        f"computing {shape[0]}x{shape[1]} possibilities matrix with {num_workers} workers..."
+    )
+    with multiprocessing.Pool(
+        num_workers,
+        initializer=_init_build_worker,
+        initargs=(
+            partial_path,
+            words_to_letter_array(guess_words),
+            words_to_letter_array(answer_words),
+            block_size,
+        ),
+    ) as pool:
+        for block_i in tqdm(
+            pool.imap_unordered(_fill_block_worker, pending_blocks),
+            total=len(pending_blocks),
+        ):
+            finished_blocks.add(block_i)
+            write_build_manifest(manifest_path, build_info, finished_blocks)
+
+    content_hash = save_table_file(
+        out_path, load_table_path(partial_path), guess_words, answer_words
+    )
+    os.remove(partial_path)
+    os.remove(manifest_path)
+    print(f"Wrote table file to {out_path} (hash {content_hash[:12]})")
+
+
+def pack_table_file(
+    dictionary: str, guess_words: List[str], answer_words: List[str]
+) -> None:
+    """Pack an existing .npy table for this dictionary into its self-describing table file"""
+    table = load_table_path(TABLE_PATHS[dictionary])
+    out_path = TABLE_FILE_PATHS[dictionary]
+    content_hash = save_table_file(out_path, table, guess_words, answer_words)
+    print(f"Wrote table file to {out_path} (hash {content_hash[:12]})")
 
 
 if __name__ == "__main__":
@@ -178,25 +443,55 @@ if __name__ == "__main__":
         default="full",
         help="What kind of matrix to generate",
     )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="""Number of worker processes to use.
+With more than 1 worker, the table is written straight to disk and an interrupted build can be resumed by running the same command again""",
+    )
+    parser.add_argument(
+        "-p",
+        "--pack-only",
+        action="store_true",
+        help="Do not recompute the matrix. Only pack an existing .npy matrix and its words into the table file",
+    )
     args = parser.parse_args()
 
     if args.type == "full":
-        words = read_parsed_words()
-        print("computing possibilities...")
-        table = compute_possibilities_table(words)
-        np.save(TABLE_PATH, table)
+        dictionary = "full"
+        guess_words = read_parsed_words()
+        answer_words = guess_words
     elif args.type == "asymmetric":
-        words = read_parsed_words()
-        answers = read_all_answers()
+        dictionary = "asymmetric"
+        answer_words = read_all_answers()
+        guess_words = order_asymmetric_guesses(read_parsed_words(), answer_words)
+    else:
+        # argparse only allows the choices above
+        assert args.type == "cheating"
+        dictionary = "answers"
+        guess_words = read_all_answers()
+        answer_words = guess_words
+
+    if args.pack_only:
+        pack_table_file(dictionary, guess_words, answer_words)
+    elif args.workers > 1:
         print("computing possibilities...")
-        table, row_keys, column_keys = compute_possibilities_table_asymmetric(
-            words, answers
+        build_possibilities_table_parallel(
+            TABLE_FILE_PATHS[dictionary], guess_words, answer_words, args.workers
         )
-        np.save(TABLE_PATH_ASYMMETRIC, table)
-        with open("data-parsed/possibilities-keys-asymmetric.pickle", "wb") as fp:
-            pickle.dump((row_keys, column_keys), fp)
-    elif args.type == "cheating":
-        answers = read_all_answers()
+    else:
         print("computing possibilities...")
-        table = compute_possibilities_table(answers)
-        np.save(TABLE_PATH_CHEATING, table)
+        table = np.empty(
+            shape=(len(guess_words), len(answer_words)), dtype="uint8"
+        )
+        print(f"computing {table.shape[0]}x{table.shape[1]} possibilities matrix...")
+        fill_possibilities_table(
+            table,
+            words_to_letter_array(guess_words),
+            words_to_letter_array(answer_words),
+        )
+        out_path = TABLE_FILE_PATHS[dictionary]
+        content_hash = save_table_file(out_path, table, guess_words, answer_words)
+        print(f"Wrote table file to {out_path} (hash {content_hash[:12]})")
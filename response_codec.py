@@ -0,0 +1,94 @@
+"""
+Encoding and decoding of guess responses.
+
+A response is one value per letter of the guess (LETTER_ABSENT, WRONG_PLACE or RIGHT_PLACE).
+It is stored as a base-3 integer, with the first letter as the least significant digit.
+There are only 3 ** 5 = 243 responses, so every conversion is a lookup in a table built once at import.
+The batch functions convert whole arrays of responses at once, e.g. a row of the possibilities table.
+"""
+
+from typing import List, Sequence
+
+import numpy as np
+
+from play import LETTER_ABSENT, RIGHT_PLACE, WRONG_PLACE
+
+NUM_RESPONSES = 3 ** 5
+ALL_LETTERS_CORRECT = NUM_RESPONSES - 1
+# the value of each digit in the code
+DIGIT_WEIGHTS = 3 ** np.arange(5, dtype=np.uint8)
+
+# response code -> the value for each letter, as a (243, 5) array
+RESPONSE_DIGITS = (
+    np.arange(NUM_RESPONSES)[:, np.newaxis] // (3 ** np.arange(5)) % 3
+).astype(np.uint8)
+RESPONSE_DIGITS.flags.writeable = False
+_RESPONSE_DIGIT_LISTS = [
+    [int(v) for v in digits] for digits in RESPONSE_DIGITS
+]  # type: List[List[int]]
+
+_DIGIT_TO_CHAR = {RIGHT_PLACE: "G", WRONG_PLACE: "Y", LETTER_ABSENT: "B"}
+# response code -> string of G (right place), Y (wrong place) and B (absent)
+RESPONSE_STRINGS = [
+    "".join(_DIGIT_TO_CHAR[v] for v in digits) for digits in _RESPONSE_DIGIT_LISTS
+]  # type: List[str]
+STRING_TO_RESPONSE = {
+    s: code for code, s in enumerate(RESPONSE_STRINGS)
+}  # type: dict[str, int]
+_RESPONSE_STRINGS_ARR = np.array(RESPONSE_STRINGS)
+_DIGITS_TO_RESPONSE = {
+    tuple(digits): code for code, digits in enumerate(_RESPONSE_DIGIT_LISTS)
+}  # type: dict[tuple, int]
+
+
+def _get_position_masks(val: int) -> np.ndarray:
+    """For each response code, a 5-bit mask of the positions with this value"""
+    return ((RESPONSE_DIGITS == val) * (1 << np.arange(5))).sum(axis=1).astype(np.uint8)
+
+
+# response code -> bit i is set iff letter i of the guess is in the right place (green), wrong place (yellow) or absent (grey)
+GREEN_MASKS = _get_position_masks(RIGHT_PLACE)
+YELLOW_MASKS = _get_position_masks(WRONG_PLACE)
+GREY_MASKS = _get_position_masks(LETTER_ABSENT)
+
+
+def decode_response(code: int) -> List[int]:
+    """Return the value for each letter. The list is a fresh copy, so the caller can change it"""
+    return list(_RESPONSE_DIGIT_LISTS[code])
+
+
+def encode_response(digits: Sequence[int]) -> int:
+    try:
+        return _DIGITS_TO_RESPONSE[tuple(digits)]
+    except KeyError:
+        raise ValueError(f"Not a valid response: {digits}")
+
+
+def response_to_string(code: int) -> str:
+    return RESPONSE_STRINGS[code]
+
+
+def response_from_string(s: str) -> int:
+    try:
+        return STRING_TO_RESPONSE[s]
+    except KeyError:
+        raise ValueError(f"Not a valid response: {s}")
+
+
+def decode_responses(codes: np.ndarray) -> np.ndarray:
+    """Decode an array of response codes. Return an array with an extra last axis of size 5"""
+    return RESPONSE_DIGITS[np.asarray(codes)]
+
+
+def encode_responses(digits: np.ndarray) -> np.ndarray:
+    """Encode an array whose last axis holds the 5 values of each response. Return a uint8 array of codes"""
+    digits = np.asarray(digits)
+    assert digits.shape[-1] == 5
+    if digits.size and (digits.min() < 0 or digits.max() > 2):
+        raise ValueError("Response values must be between 0 and 2")
+    return (digits.astype(np.uint8) * DIGIT_WEIGHTS).sum(axis=-1, dtype=np.uint8)
+
+
+def responses_to_strings(codes: np.ndarray) -> np.ndarray:
+    """Convert an array of response codes into an array of strings"""
+    return _RESPONSE_STRINGS_ARR[np.asarray(codes)]
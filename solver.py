@@ -1,75 +1,74 @@
-import json
 import logging
+import multiprocessing
 import os.path
 import random
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import coloredlogs
-import pandas as pd
 import numpy as np
+import pandas as pd
 from tqdm import tqdm
 
+from eval_results import (
+    EvalSummary,
+    get_recorded_answers,
+    make_eval_record,
+    open_eval_results,
+    write_eval_json,
+    write_eval_result,
+)
+from opening_book import load_opening_book
 from parse_data import read_all_answers, read_parsed_words, read_past_answers
+from partition_scores import STRATEGIES, get_strategy_scores
 from play import RIGHT_PLACE, eval_guess, WRONG_PLACE, LETTER_ABSENT
 from possibilities_table import (
     array_to_integer,
-    load_possibilities_table,
+    load_possibilities,
     load_possibilities_table_df,
+    load_table_path,
 )
+from solver_state import GuessMemo, SolverSession, SolverState
 
 FIRST_GUESS_WORD = "serai"
+MEMO_CACHE_DIR = "cache"
 
 
-def prune_table(table: pd.DataFrame, last_guess: str, guess_result: List[int]):
-    # modify the table
-    columns_to_keep = []
-    rval = array_to_integer(guess_result)
-    for answer in table.columns:
-        if table.loc[last_guess][answer] == rval:
-            columns_to_keep.append(answer)
-    # print("We're keeping the following columns:")
-    # print(columns_to_keep)
-    table = table[columns_to_keep]
-    table = table[table.index.isin(columns_to_keep)]
-    return table
-
-
-def get_next_guess_mean_partition(table: pd.DataFrame) -> str:
-    def get_mean_partition(row) -> int:
-        d = row.value_counts().to_dict()
-        arr = np.array([v for v in d.values()])
-        return np.mean(arr)
-
-    part_series = table.apply(get_mean_partition, axis=1)
-    part_df = pd.DataFrame(part_series, columns=["mean_partition"], index=table.index)
-    i = part_df["mean_partition"].idxmin()
-    return i
-
-
-def get_next_guess_worst_partition(table: pd.DataFrame) -> str:
-    """The table will only contain those words that remain"""
-    # compute the max partitions
-
-    def get_worst_partition(row) -> int:
-        d = row.value_counts().to_dict()
-        return max(d.values())
-
-    # for each remaining guess, compute the worst partition
-    part_series = table.apply(get_worst_partition, axis=1)
-    # re-index it with words so return value is easier
-    part_df = pd.DataFrame(part_series, columns=["worst_partition"], index=table.index)
-    # return the word with the smallest worst partition
-    i = part_df["worst_partition"].idxmin()
-    return i
-
-
-def get_next_guess(table: pd.DataFrame, strategy: str) -> str:
-    if strategy == "mean_partition":
-        return get_next_guess_mean_partition(table)
-    elif strategy == "worst_partition":
-        return get_next_guess_worst_partition(table)
+def load_solver_session(
+    words: List[str], matrix_df_path: Optional[str] = None, hard_mode: bool = False
+) -> SolverSession:
+    """
+    Load the table once. The session can then be used to play any number of games.
+    By default (and for any .npy path) the table is memory-mapped rather than read into memory
+    Only an explicitly-specified parquet matrix is decompressed
+    :param hard_mode: Whether to play every game in hard mode
+    """
+    if matrix_df_path is None:
+        possibilities = load_possibilities("full")
+        return SolverSession(
+            possibilities.table,
+            possibilities.guess_words,
+            possibilities.answer_words,
+            content_hash=possibilities.content_hash,
+            hard_mode=hard_mode,
+        )
+    elif matrix_df_path.endswith(".npy"):
+        return SolverSession(
+            load_table_path(matrix_df_path), words, words, hard_mode=hard_mode
+        )
     else:
-        raise NotImplementedError(strategy)
+        df = load_possibilities_table_df(matrix_df_path)
+        return SolverSession(
+            df.to_numpy(), list(df.index), list(df.columns), hard_mode=hard_mode
+        )
+
+
+def get_next_guess(state: SolverState, strategy: str) -> str:
+    """
+    Only words that could still be the answer are considered
+    Return the word with the best score under this strategy (see STRATEGIES)
+    """
+    scores = state.score_candidate_guesses()
+    return state.pick_next_guess(get_strategy_scores(scores, strategy))
 
 
 def solver(
@@ -79,10 +78,14 @@ def solver(
     strategy: str,
     matrix_df_path: Optional[str] = None,
     verbose: Optional[bool] = True,
+    session: Optional[SolverSession] = None,
+    memo: Optional[GuessMemo] = None,
 ) -> Tuple[bool, int, List[str]]:
     """
     :param first_word: The first word to use
     :param verbose: Control whether we are actually outputing or not
+    :param session: A previously loaded session. If not provided, load the table from matrix_df_path
+    :param memo: Next guesses seen in previous games with the same strategy and first word. Updated in place
     The method *must not* modify the table.
     """
 
@@ -90,26 +93,33 @@ def solver(
         if verbose:
             print(text)
 
-    if matrix_df_path and matrix_df_path.endswith(".npy"):
-        # NOTE: this doesn't use the path, just loads the standard npy file for speed
-        table = load_possibilities_table(words)
-    else:
-        table = load_possibilities_table_df(matrix_df_path)
+    if session is None:
+        session = load_solver_session(words, matrix_df_path)
+    state = session.new_game()
 
     guesses = []  # type: List[str]
+    history = []  # type: List[Tuple[str, int]]
     guess = first_word
     is_solved = False
 
     while len(guesses) < 6 and not is_solved:
         if guesses == []:
             guess = first_word
+        elif memo is None:
+            guess = get_next_guess(state, strategy=strategy)
         else:
-            guess = get_next_guess(table, strategy=strategy)
+            memo_guess = memo.get(tuple(history))
+            if memo_guess is None:
+                guess = get_next_guess(state, strategy=strategy)
+                memo.put(tuple(history), guess)
+            else:
+                guess = memo_guess
 
         guesses.append(guess)
 
         solver_print(f"{len(guesses)}. Guessed {guess}")
         guess_result = eval_guess(guess, answer)
+        history.append((guess, array_to_integer(guess_result)))
         solver_print(f"Guess result: {guess_result}")
 
         if guess_result == [
@@ -122,8 +132,8 @@ def solver(
             is_solved = True
             break
         else:
-            table = prune_table(table, guess, guess_result)
-            solver_print(f"There are now {table.shape[0]} possibilities")
+            state.prune(guess, guess_result)
+            solver_print(f"There are now {state.num_remaining} possibilities")
 
     if is_solved:
         solver_print(
@@ -134,23 +144,166 @@ def solver(
     return is_solved, len(guesses), guesses
 
 
-def eval_solver(
-    words: List[str],
-    num_answers: int,
+def get_memo_path(session: SolverSession, strategy: str, first_word: str) -> str:
+    assert session.content_hash is not None
+    mode = "-hard-mode" if session.hard_mode else ""
+    return os.path.join(
+        MEMO_CACHE_DIR,
+        f"next-guess-memo-{strategy}-{first_word}{mode}-{session.content_hash[:16]}.json",
+    )
+
+
+def get_memo_meta(session: SolverSession, strategy: str, first_word: str) -> dict:
+    return {
+        "table_hash": session.content_hash,
+        "strategy": strategy,
+        "first_word": first_word,
+        "hard_mode": session.hard_mode,
+    }
+
+
+def load_memo(session: SolverSession, strategy: str, first_word: str) -> GuessMemo:
+    """Load the memo saved by a previous run, or return an empty memo"""
+    path = get_memo_path(session, strategy, first_word)
+    if os.path.exists(path):
+        memo = GuessMemo.load(path, get_memo_meta(session, strategy, first_word))
+        print(f"Loaded {len(memo)} memoized guesses from {path}")
+        return memo
+    return GuessMemo()
+
+
+def save_memo(
+    memo: GuessMemo, session: SolverSession, strategy: str, first_word: str
+) -> None:
+    os.makedirs(MEMO_CACHE_DIR, exist_ok=True)
+    path = get_memo_path(session, strategy, first_word)
+    memo.save(path, get_memo_meta(session, strategy, first_word))
+    print(f"Saved {len(memo)} memoized guesses to {path}")
+
+
+# set once per worker process by _init_eval_worker
+_WORKER_SESSION = None  # type: Optional[SolverSession]
+# (strategy, first word) -> memo shared by all the games played by this worker
+_WORKER_MEMOS = {}  # type: Dict[Tuple[str, str], GuessMemo]
+
+
+def _init_eval_worker(
+    matrix_df_path: Optional[str],
+    hard_mode: bool,
+    memos: Dict[Tuple[str, str], GuessMemo],
+):
+    # the default table is memory-mapped, so all the workers share the same pages
+    global _WORKER_SESSION, _WORKER_MEMOS
+    _WORKER_SESSION = load_solver_session(
+        read_parsed_words(), matrix_df_path, hard_mode=hard_mode
+    )
+    _WORKER_MEMOS = memos
+
+
+def _solve_in_worker(task: Tuple[str, str, str]) -> Tuple[bool, int, List[str]]:
+    answer, first_word, strategy = task
+    memo = _WORKER_MEMOS.setdefault((strategy, first_word), GuessMemo())
+    return solver(
+        answer,
+        [],
+        first_word=first_word,
+        strategy=strategy,
+        verbose=False,
+        session=_WORKER_SESSION,
+        memo=memo,
+    )
+
+
+def iter_task_results(
+    tasks: List[Tuple[str, str, str]],
+    memos: Dict[Tuple[str, str], GuessMemo],
+    session: Optional[SolverSession] = None,
+    matrix_df_path: Optional[str] = None,
+    jobs: int = 1,
+    hard_mode: bool = False,
+) -> Iterator[Tuple[Tuple[str, str, str], Tuple[bool, int, List[str]]]]:
+    """
+    Play every game. Yield (task, solver result) pairs in the same order as tasks
+    :param tasks:   (answer, first word, strategy) for each game
+    :param memos:   (strategy, first word) -> memo shared by all the games with that strategy and first word.
+                    Missing memos are added. Each worker starts from a copy, so in that case the memos are
+                    filled in from the finished games instead
+    :param jobs:    With more than 1 job, the games are spread over a pool of worker processes.
+                    Each worker loads its own session from matrix_df_path
+    :param hard_mode:   Only used when the session has to be loaded
+    """
+    if jobs > 1:
+        # big enough chunks to amortize the IPC, small enough to keep every worker busy
+        chunksize = max(1, len(tasks) // (jobs * 8))
+        with multiprocessing.Pool(
+            jobs,
+            initializer=_init_eval_worker,
+            initargs=(matrix_df_path, hard_mode, memos),
+        ) as pool:
+            # imap (rather than imap_unordered) keeps the output order deterministic
+            for task, result in zip(
+                tasks, pool.imap(_solve_in_worker, tasks, chunksize=chunksize)
+            ):
+                answer, first_word, strategy = task
+                guesses = result[2]
+                memos.setdefault((strategy, first_word), GuessMemo()).record_game(
+                    guesses,
+                    [array_to_integer(eval_guess(guess, answer)) for guess in guesses],
+                )
+                yield task, result
+    else:
+        if session is None:
+            session = load_solver_session(
+                read_parsed_words(), matrix_df_path, hard_mode=hard_mode
+            )
+        for task in tasks:
+            answer, first_word, strategy = task
+            result = solver(
+                answer,
+                [],
+                first_word=first_word,
+                strategy=strategy,
+                verbose=False,
+                session=session,
+                memo=memos.setdefault((strategy, first_word), GuessMemo()),
+            )
+            yield task, result
+
+
+def iter_solver_results(
+    answers: List[str],
     first_word: str,
     strategy: str,
-    out_dir: str,
+    session: Optional[SolverSession] = None,
     matrix_df_path: Optional[str] = None,
-):
+    jobs: int = 1,
+    memo: Optional[GuessMemo] = None,
+    hard_mode: bool = False,
+) -> Iterator[Tuple[str, Tuple[bool, int, List[str]]]]:
     """
-    Evaluate the solver on the first `num_answers` past answers
+    Solve every answer. Yield (answer, solver result) pairs in the same order as answers
+    See iter_task_results for the other parameters
+    :param memo:    Shared by all the games
+    """
+    if memo is None:
+        memo = GuessMemo()
+    tasks = [(answer, first_word, strategy) for answer in answers]
+    for task, result in iter_task_results(
+        tasks,
+        {(strategy, first_word): memo},
+        session=session,
+        matrix_df_path=matrix_df_path,
+        jobs=jobs,
+        hard_mode=hard_mode,
+    ):
+        yield task[0], result
+
+
+def get_eval_answers(num_answers: int) -> Tuple[List[str], str]:
+    """
+    Return the first `num_answers` past answers and the name of the dataset they come from
     If `num_answers` is more than the number of past answers, will display a warning and will instead use *all* answers - past and future
     """
-    if not os.path.exists(out_dir):
-        logging.critical("out_dir %s does not exist", out_dir)
-        exit(1)
-
-    # NOTE to self: for the future blog post, it took about 5 minutes to run this for all answers
     possible_answers = read_past_answers()
     # we use this variable as part of the filename
     dataset = "past-answers"
@@ -170,64 +323,200 @@ def eval_solver(
             num_answers,
             len(possible_answers),
         )
-        num_answers = len(possible_answers)
+    return possible_answers, dataset
 
-    d = {}
-    print(
-        f"Solving {len(possible_answers)} puzzles with first word {first_word} and strategy {strategy}..."
-    )
-    for answer in tqdm(possible_answers):
-        is_solved, num_guesses, guesses = solver(
-            answer,
-            words,
-            first_word=first_word,
-            strategy=strategy,
-            matrix_df_path=matrix_df_path,
-            verbose=False,
-        )
-        d[answer] = {
-            "is_solved": is_solved,
-            "num_guesses": num_guesses,
-            "guesses": guesses,
-        }
-        if not is_solved:
-            logging.error(f"failed to solve when answer was {answer}")
 
+def eval_solver(
+    words: List[str],
+    num_answers: int,
+    first_word: str,
+    strategy: str,
+    out_dir: str,
+    matrix_df_path: Optional[str] = None,
+    session: Optional[SolverSession] = None,
+    jobs: int = 1,
+    persist_memo: bool = False,
+    hard_mode: bool = False,
+    resume: bool = False,
+):
+    """
+    Evaluate the solver on the first `num_answers` past answers
+    If `num_answers` is more than the number of past answers, will display a warning and will instead use *all* answers - past and future
+    :param session: A previously loaded session. If not provided, load the table from matrix_df_path
+    :param jobs: Number of worker processes to spread the games over
+    :param persist_memo: Load the next guesses memoized by previous runs from the cache directory, and save them back when done.
+                         Only for tables loaded from a table file, since the memo is keyed by the content hash
+    :param hard_mode: Play every game in hard mode. If a session is given, use its mode instead
+    :param resume: Skip the answers which already have a result in the .jsonl file written next to the output file
+    """
+    if not os.path.exists(out_dir):
+        logging.critical("out_dir %s does not exist", out_dir)
+        exit(1)
+
+    # NOTE to self: for the future blog post, it took about 5 minutes to run this for all answers
+    possible_answers, dataset = get_eval_answers(num_answers)
+
+    # load the table once for all the games
+    if session is None and (jobs <= 1 or persist_memo):
+        session = load_solver_session(words, matrix_df_path, hard_mode=hard_mode)
+    if session is not None:
+        hard_mode = session.hard_mode
+
+    # the session whose memo is loaded from (and saved back to) the cache directory, if any
+    memo_session = None  # type: Optional[SolverSession]
+    if persist_memo:
+        # (always loaded above)
+        assert session is not None
+        if session.content_hash is None:
+            logging.warning("Cannot persist the memo for a table without a content hash")
+        else:
+            memo_session = session
+    if memo_session is not None:
+        memo = load_memo(memo_session, strategy, first_word)
+    else:
+        memo = GuessMemo()
+
+    # record that we played in hard mode
+    mode = "-hard-mode" if hard_mode else ""
     if matrix_df_path:
         # we want to record that we used a custom matrix here
-        out_fname = f"data-parsed/solver-eval/solver-eval-strat-{strategy}-{dataset}-{len(possible_answers)}-{first_word}-custom-matrix.json"
+        out_fname = f"data-parsed/solver-eval/solver-eval-strat-{strategy}-{dataset}-{len(possible_answers)}-{first_word}{mode}-custom-matrix.json"
     else:
-        out_fname = f"data-parsed/solver-eval/solver-eval-strat-{strategy}-{dataset}-{len(possible_answers)}-{first_word}.json"
+        out_fname = f"data-parsed/solver-eval/solver-eval-strat-{strategy}-{dataset}-{len(possible_answers)}-{first_word}{mode}.json"
     out_path = os.path.join(out_dir, out_fname)
+    # every game is written here as soon as it's done
+    results_path = os.path.splitext(out_path)[0] + ".jsonl"
 
-    out = {
-        "per_word_results": d,
+    answers_to_solve = possible_answers
+    if resume:
+        recorded = get_recorded_answers(results_path)
+        answers_to_solve = [answer for answer in possible_answers if answer not in recorded]
+        print(f"Resuming: {len(possible_answers) - len(answers_to_solve)} puzzles already solved in {results_path}")
+
+    print(
+        f"Solving {len(answers_to_solve)} puzzles with first word {first_word} and strategy {strategy}..."
+    )
+    results_it = iter_solver_results(
+        answers_to_solve,
+        first_word=first_word,
+        strategy=strategy,
+        session=session,
+        matrix_df_path=matrix_df_path,
+        jobs=jobs,
+        memo=memo,
+        hard_mode=hard_mode,
+    )
+    with open_eval_results(results_path, resume=resume) as results_fp:
+        for answer, (is_solved, num_guesses, guesses) in tqdm(
+            results_it, total=len(answers_to_solve)
+        ):
+            write_eval_result(
+                results_fp, make_eval_record(answer, is_solved, num_guesses, guesses)
+            )
+            if not is_solved:
+                logging.error(f"failed to solve when answer was {answer}")
+    if memo_session is not None:
+        save_memo(memo, memo_session, strategy, first_word)
+
+    info = {
         "first_word": first_word,
         "num_answers_tested": len(possible_answers),
         "strategy": strategy,
         "dataset": dataset,
+        "hard_mode": hard_mode,
     }
-    with open(out_path, "w") as fp:
-        json.dump(out, fp, indent=4, sort_keys=True)
+    # the per-word results are streamed from the .jsonl file
+    summary = write_eval_json(out_path, results_path, info)
     print(f"Eval done. Wrote to {out_path}")
+    summary.print()
+
+
+def rank_first_words(session: SolverSession, strategy: str, k: int) -> List[str]:
+    """Score every candidate first word against all the answers with this strategy, and return the best k"""
+    state = session.new_game()
+    scores = get_strategy_scores(state.score_candidate_guesses(), strategy)
+    candidates = state.get_candidate_guesses()
+    # stable, so ties go to the word which comes first
+    best = np.argsort(scores, kind="stable")[:k]
+    return [session.guess_words[candidates[i]] for i in best]
+
+
+def sweep_solver(
+    words: List[str],
+    num_answers: int,
+    first_words: List[str],
+    strategies: List[str],
+    out_dir: str,
+    matrix_df_path: Optional[str] = None,
+    session: Optional[SolverSession] = None,
+    jobs: int = 1,
+    hard_mode: bool = False,
+):
+    """
+    Evaluate every combination of first word and strategy on the same answers (see eval_solver) in a single pool
+    Write one row per combination to a parquet file
+    """
+    if not os.path.exists(out_dir):
+        logging.critical("out_dir %s does not exist", out_dir)
+        exit(1)
+
+    possible_answers, dataset = get_eval_answers(num_answers)
+    if session is None and jobs <= 1:
+        session = load_solver_session(words, matrix_df_path, hard_mode=hard_mode)
+    if session is not None:
+        hard_mode = session.hard_mode
+
+    tasks = [
+        (answer, first_word, strategy)
+        for strategy in strategies
+        for first_word in first_words
+        for answer in possible_answers
+    ]
+    # only the summaries are kept around, so memory doesn't grow with the number of games
+    summaries = {
+        (first_word, strategy): EvalSummary()
+        for strategy in strategies
+        for first_word in first_words
+    }
+    print(
+        f"Solving {len(possible_answers)} puzzles for {len(first_words)} first words and {len(strategies)} strategies..."
+    )
+    results_it = iter_task_results(
+        tasks,
+        {},
+        session=session,
+        matrix_df_path=matrix_df_path,
+        jobs=jobs,
+        hard_mode=hard_mode,
+    )
+    for (answer, first_word, strategy), (is_solved, num_guesses, guesses) in tqdm(
+        results_it, total=len(tasks)
+    ):
+        summaries[(first_word, strategy)].add(
+            make_eval_record(answer, is_solved, num_guesses, guesses)
+        )
+
     rows = []
-    for answer, v in d.items():
+    for (first_word, strategy), summary in summaries.items():
         rows.append(
             {
-                "answer": answer,
-                "num_guesses": v["num_guesses"],
-                "is_solved": v["is_solved"],
+                "first_word": first_word,
+                "strategy": strategy,
+                "num_answers_tested": summary.num_puzzles,
+                "mean_guesses": summary.mean_guesses,
+                "num_solved": summary.num_solved,
+                "num_unsolved": summary.num_unsolved,
             }
         )
     df = pd.DataFrame(rows)
-    print(f"Mean # of guesses per puzzle: {df.num_guesses.mean():.2f}")
-    num_unsolved = df[df.is_solved == False].shape[0]
-    num_solved = df[df.is_solved].shape[0]
-    num_puzzles = len(df)
-    print(f"# puzzles solved: {num_solved} ({num_solved / num_puzzles * 100:.1f}%)")
-    print(
-        f"# puzzles unsolved: {num_unsolved} ({num_unsolved / num_puzzles * 100:.1f})%"
-    )
+
+    mode = "-hard-mode" if hard_mode else ""
+    custom = "-custom-matrix" if matrix_df_path else ""
+    out_fname = f"data-parsed/solver-eval/solver-sweep-{dataset}-{len(possible_answers)}{mode}{custom}.parquet"
+    out_path = os.path.join(out_dir, out_fname)
+    df.to_parquet(out_path)
+    print(f"Sweep done. Wrote to {out_path}")
+    print(df.sort_values(by=["num_unsolved", "mean_guesses"]).to_string(index=False))
 
 
 def get_interactive_guess_result(guess: str) -> List[int]:
@@ -253,12 +542,19 @@ def play_with_solver(
     first_word: str,
     strategy: str,
     matrix_df_path: Optional[str] = None,
+    session: Optional[SolverSession] = None,
+    book: Optional[GuessMemo] = None,
 ) -> Tuple[bool, int, List[str]]:
-    """Play interactively with the solver when you don't know the answer"""
+    """
+    Play interactively with the solver when you don't know the answer
+    :param book: An opening book for this first word and strategy. Positions which are not in the book are computed
+    """
 
-    # table = load_possibilities_table(words)
-    table = load_possibilities_table_df(matrix_df_path)
+    if session is None:
+        session = load_solver_session(words, matrix_df_path)
+    state = session.new_game()
     guesses = []  # type: List[str]
+    history = []  # type: List[Tuple[str, int]]
     guess = first_word
     is_solved = False
 
@@ -266,13 +562,18 @@ def play_with_solver(
         if guesses == []:
             guess = first_word
         else:
-            guess = get_next_guess(table, strategy)
+            book_guess = book.get(tuple(history)) if book is not None else None
+            if book_guess is not None:
+                guess = book_guess
+            else:
+                guess = get_next_guess(state, strategy)
 
         guesses.append(guess)
 
         print(f"{len(guesses)}. Guessed {guess}")
         guess_result = get_interactive_guess_result(guess)
         # print(f"Guess result: {guess_result}")
+        history.append((guess, array_to_integer(guess_result)))
 
         if guess_result == [
             RIGHT_PLACE,
@@ -284,8 +585,8 @@ def play_with_solver(
             is_solved = True
             break
         else:
-            table = prune_table(table, guess, guess_result)
-            print(f"There are now {table.shape[0]} possibilities")
+            state.prune(guess, guess_result)
+            print(f"There are now {state.num_remaining} possibilities")
 
     if is_solved:
         print(f"We solved it after {len(guesses)} guesses! The word was {guesses[-1]}.")
@@ -309,10 +610,11 @@ if __name__ == "__main__":
         "-a",
         "--action",
         type=str,
-        choices=["play", "eval_solver", "interactive"],
+        choices=["play", "eval_solver", "interactive", "sweep"],
         help="""What do you want to do?
 play -> have the solver solve a random puzzle
 eval_solver -> evaluate the solver on all the past answers and write stats out to a file
+sweep -> evaluate the solver for several first words and strategies at once and write a summary table out to a file
 interactive -> have the solver help you solve a puzzle with an unknown answer interactively""",
         required=True,
     )
@@ -333,7 +635,7 @@ interactive -> have the solver help you solve a puzzle with an unknown answer in
     parser.add_argument(
         "-t",
         "--strategy",
-        choices=["mean_partition", "worst_partition"],
+        choices=list(STRATEGIES.keys()),
         type=str,
         default="worst_partition",
         help="The strategy to use when selecting the next guess",
@@ -352,6 +654,46 @@ interactive -> have the solver help you solve a puzzle with an unknown answer in
         help="Output directory where eval_solver will write files (must exist)",
         default="data-parsed/solver-eval",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes for eval_solver. The workers share the memory-mapped table",
+    )
+    parser.add_argument(
+        "--persist-memo",
+        action="store_true",
+        help="Keep the next guesses memoized by eval_solver in the cache directory, and reuse them on the next run",
+    )
+    parser.add_argument(
+        "--hard-mode",
+        action="store_true",
+        help="Play in hard mode: every guess after the first has to use all the hints revealed so far",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="For eval_solver, skip the answers already recorded in the .jsonl results file of an interrupted run",
+    )
+    parser.add_argument(
+        "--first-words",
+        type=str,
+        help="For sweep, comma-separated list of first words to try",
+        default=None,
+    )
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        help="For sweep, try the best K first words according to the first strategy (instead of --first-words)",
+        default=-1,
+    )
+    parser.add_argument(
+        "--strategies",
+        type=str,
+        help="For sweep, comma-separated list of strategies to try. By default only --strategy",
+        default=None,
+    )
     args = parser.parse_args()
     coloredlogs.install()
 
@@ -368,6 +710,9 @@ interactive -> have the solver help you solve a puzzle with an unknown answer in
         print("ERROR: first word a valid 5-letter word")
         exit(1)
 
+    # every action is built on the same session, so the table is only loaded once
+    session = load_solver_session(words, args.matrix_path, hard_mode=args.hard_mode)
+
     if args.action == "play":
         answer = random.choice(words)
         print(f"Chose random word for answer: {answer}")
@@ -376,7 +721,7 @@ interactive -> have the solver help you solve a puzzle with an unknown answer in
             words,
             first_word=args.first_word,
             strategy=args.strategy,
-            matrix_df_path=args.matrix_path,
+            session=session,
         )
     elif args.action == "eval_solver":
         eval_solver(
@@ -386,15 +731,55 @@ interactive -> have the solver help you solve a puzzle with an unknown answer in
             strategy=args.strategy,
             matrix_df_path=args.matrix_path,
             out_dir=args.output_dir,
+            session=session,
+            jobs=args.jobs,
+            persist_memo=args.persist_memo,
+            resume=args.resume,
         )
     elif args.action == "interactive":
         # answer = random.choice(words)
         # print(f"Chose random word for answer: {answer}")
+        book = load_opening_book(session, args.strategy, args.first_word)
+        if book is None:
+            logging.info(
+                "No opening book for %s with strategy %s. Run opening_book.py to build one",
+                args.first_word,
+                args.strategy,
+            )
         play_with_solver(
             words,
             first_word=args.first_word,
             strategy=args.strategy,
+            session=session,
+            book=book,
+        )
+    elif args.action == "sweep":
+        strategies = [args.strategy]
+        if args.strategies:
+            strategies = args.strategies.split(",")
+        for strategy in strategies:
+            if strategy not in STRATEGIES:
+                print(f"ERROR: unknown strategy {strategy}")
+                exit(1)
+        if args.top_k > 0:
+            first_words = rank_first_words(session, strategies[0], args.top_k)
+        elif args.first_words:
+            first_words = args.first_words.split(",")
+        else:
+            first_words = [args.first_word]
+        for first_word in first_words:
+            if first_word not in session.guess_indexes:
+                print(f"ERROR: first word {first_word} is not a valid guess")
+                exit(1)
+        sweep_solver(
+            words,
+            num_answers=args.num_answers,
+            first_words=first_words,
+            strategies=strategies,
             matrix_df_path=args.matrix_path,
+            out_dir=args.output_dir,
+            session=session,
+            jobs=args.jobs,
         )
     else:
         raise NotImplementedError
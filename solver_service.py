@@ -0,0 +1,234 @@
+"""
+A long-running solver service, so that tools don't pay for the imports and the table loading on every call.
+
+Listens on localhost and speaks JSON over HTTP. Every request is a POST with a JSON body:
+    POST /next-guess    {"history": [["serai", "BBYBB"], ...], "strategy": "worst_partition"}
+                        -> {"guess": "...", "num_remaining": ...}
+    POST /remaining     {"history": [["serai", "BBYBB"], ...]}
+                        -> {"remaining": [...], "num_remaining": ...}
+
+The history is every guess so far with its result (G = right place, Y = wrong place, B = absent).
+The server handles each connection on its own thread. The scoring is done by a single batching thread, which
+collects the requests that arrive within BATCH_WINDOW of each other and scores all of them in one pass.
+"""
+
+import json
+import logging
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+
+import coloredlogs
+
+from partition_scores import STRATEGIES, get_strategy_scores, score_guesses_batch
+from possibilities_table import guess_response_from_string, integer_to_arr
+from solver_state import GuessMemo, SolverSession, SolverState
+
+DEFAULT_PORT = 8765
+# how long (in seconds) the batching thread waits for more requests after the first one arrives
+BATCH_WINDOW = 0.002
+# most requests scored in a single batch
+MAX_BATCH_SIZE = 256
+# most histories remembered per strategy. Clients can post any history, so this has to be bounded
+MEMO_SIZE = 100_000
+
+
+class BadRequest(Exception):
+    pass
+
+
+class PendingGuess:
+    """A next-guess request waiting for the batching thread"""
+
+    def __init__(self, state: SolverState, strategy: str):
+        self.state = state
+        self.strategy = strategy
+        self.guess = None  # type: str | None
+        self.error = None  # type: Exception | None
+        self.done = threading.Event()
+
+
+class SolverService:
+    def __init__(self, session: SolverSession):
+        self.session = session
+        self.pending = queue.Queue()  # type: queue.Queue[PendingGuess]
+        # strategy -> next guess for the most recently seen histories
+        self.memos = {strategy: GuessMemo(max_size=MEMO_SIZE) for strategy in STRATEGIES}
+        self.memo_lock = threading.Lock()
+        self.batch_thread = threading.Thread(target=self._run_batches, daemon=True)
+        self.batch_thread.start()
+
+    def replay(self, history: List[Tuple[str, str]]) -> SolverState:
+        """Return the state after the guesses in history"""
+        state = self.session.new_game()
+        for guess, result in history:
+            if guess not in self.session.guess_indexes:
+                raise BadRequest(f"{guess} is not a valid guess")
+            try:
+                rval = guess_response_from_string(result)
+            except Exception:
+                raise BadRequest(f"{result} is not a valid result")
+            state.prune(guess, integer_to_arr(rval))
+        return state
+
+    def get_remaining(self, history: List[Tuple[str, str]]) -> List[str]:
+        return self.replay(history).get_remaining_words()
+
+    def get_next_guess(
+        self, history: List[Tuple[str, str]], strategy: str
+    ) -> Tuple[str, int]:
+        """Return the next guess and the number of possible answers left"""
+        if strategy not in STRATEGIES:
+            raise BadRequest(f"unknown strategy {strategy}")
+        state = self.replay(history)
+        if state.num_remaining == 0:
+            raise BadRequest("no answer is consistent with this history")
+
+        key = state.get_history()
+        with self.memo_lock:
+            guess = self.memos[strategy].get(key)
+        if guess is None:
+            pending = PendingGuess(state, strategy)
+            self.pending.put(pending)
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            guess = pending.guess
+            assert guess is not None
+            with self.memo_lock:
+                self.memos[strategy].put(key, guess)
+        return guess, state.num_remaining
+
+    def _next_batch(self) -> List[PendingGuess]:
+        batch = [self.pending.get()]
+        try:
+            while len(batch) < MAX_BATCH_SIZE:
+                batch.append(self.pending.get(timeout=BATCH_WINDOW))
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run_batches(self) -> None:
+        while True:
+            batch = self._next_batch()
+            try:
+                queries = [
+                    (p.state.remaining, p.state.get_candidate_guesses()) for p in batch
+                ]
+                all_scores = score_guesses_batch(self.session.table, queries)
+                for p, scores in zip(batch, all_scores):
+                    p.guess = p.state.pick_next_guess(
+                        get_strategy_scores(scores, p.strategy)
+                    )
+            except Exception as e:
+                logging.exception("Failed to score a batch of %d requests", len(batch))
+                for p in batch:
+                    p.error = e
+            for p in batch:
+                p.done.set()
+
+
+def parse_history(body: dict) -> List[Tuple[str, str]]:
+    history = body.get("history", [])
+    if not isinstance(history, list) or not all(
+        isinstance(step, list) and len(step) == 2 for step in history
+    ):
+        raise BadRequest("history must be a list of [guess, result] pairs")
+    return [(str(guess).lower(), str(result).upper()) for guess, result in history]
+
+
+def make_handler(service: SolverService):
+    class SolverRequestHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, out: dict) -> None:
+            body = json.dumps(out).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(body, dict):
+                    raise BadRequest("body must be a JSON object")
+                history = parse_history(body)
+                if self.path == "/next-guess":
+                    strategy = body.get("strategy", "worst_partition")
+                    guess, num_remaining = service.get_next_guess(history, strategy)
+                    self._send_json(
+                        200, {"guess": guess, "num_remaining": num_remaining}
+                    )
+                elif self.path == "/remaining":
+                    remaining = service.get_remaining(history)
+                    self._send_json(
+                        200, {"remaining": remaining, "num_remaining": len(remaining)}
+                    )
+                else:
+                    self._send_json(404, {"error": f"unknown path {self.path}"})
+            except (BadRequest, json.JSONDecodeError) as e:
+                self._send_json(400, {"error": str(e)})
+            except Exception as e:
+                logging.exception("Failed to handle request")
+                self._send_json(500, {"error": str(e)})
+
+        def log_message(self, format: str, *args) -> None:
+            logging.debug(format, *args)
+
+    return SolverRequestHandler
+
+
+class SolverHTTPServer(ThreadingHTTPServer):
+    # the whole point is for many clients to connect at once, so don't refuse them
+    request_queue_size = 256
+
+
+def serve(session: SolverSession, port: int = DEFAULT_PORT) -> None:
+    service = SolverService(session)
+    server = SolverHTTPServer(("127.0.0.1", port), make_handler(service))
+    logging.info("Solver service listening on http://127.0.0.1:%d", port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    from parse_data import read_parsed_words
+    from solver import load_solver_session
+
+    coloredlogs.install()
+    logging.basicConfig(level=logging.INFO)
+
+    parser = ArgumentParser()
+    parser.add_argument(
+        "-p",
+        "--port",
+        type=int,
+        default=DEFAULT_PORT,
+        help="Port to listen on (localhost only)",
+    )
+    parser.add_argument(
+        "-m",
+        "--matrix-path",
+        type=str,
+        help="If specified, use this path to the matrix instead of the default table",
+        default=None,
+    )
+    parser.add_argument(
+        "--hard-mode",
+        action="store_true",
+        help="Only suggest guesses which use all the hints so far",
+    )
+    args = parser.parse_args()
+
+    session = load_solver_session(
+        read_parsed_words(), args.matrix_path, hard_mode=args.hard_mode
+    )
+    serve(session, args.port)
@@ -0,0 +1,227 @@
+"""
+The state of a game being played by the solver.
+
+Rather than pruning a DataFrame after each guess, we keep the (read-only) table once
+and only track the ids of the answers which are still possible.
+A SolverSession loads and indexes the table once, and then hands out a fresh SolverState for every game.
+"""
+
+import json
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from hard_mode import HardModeFilter
+from partition_scores import PartitionScores, score_guesses
+from possibilities_table import array_to_integer
+
+
+# the (guess, response) pairs seen so far in a game
+History = Tuple[Tuple[str, int], ...]
+
+
+class SolverState:
+    def __init__(
+        self,
+        table: np.ndarray,
+        guess_words: List[str],
+        answer_words: List[str],
+        answer_rows: Optional[np.ndarray] = None,
+        guess_indexes: Optional[Dict[str, int]] = None,
+        hard_mode_filter: Optional[HardModeFilter] = None,
+    ):
+        """
+        :param table:               table[i, j] is the response for guess_words[i] when the answer is answer_words[j]
+        :param answer_rows:         answer_rows[j] is the row of answer_words[j] in the table, or -1 if it is not a guess word.
+                                    Computed if not provided
+        :param guess_indexes:       Map from guess word to its row in the table. Computed if not provided
+        :param hard_mode_filter:    If provided, play in hard mode: candidate guesses must use all the hints so far
+        """
+        self.table = table
+        self.guess_words = guess_words
+        self.answer_words = answer_words
+        if guess_indexes is None:
+            guess_indexes = get_guess_indexes(guess_words)
+        self.guess_indexes = guess_indexes
+        if answer_rows is None:
+            answer_rows = get_answer_rows(guess_indexes, answer_words)
+        self.answer_rows = answer_rows
+        self.hard_mode_filter = hard_mode_filter
+        # the ids (columns) of the answers which are still possible, in ascending order
+        self.remaining = np.arange(len(answer_words))
+        # the rows of the guesses so far and their results
+        self.guesses = []  # type: List[int]
+        self.guess_results = []  # type: List[int]
+
+    def copy(self) -> "SolverState":
+        """Return an independent copy of this state. The table and indexes are shared"""
+        state = SolverState(
+            self.table,
+            self.guess_words,
+            self.answer_words,
+            answer_rows=self.answer_rows,
+            guess_indexes=self.guess_indexes,
+            hard_mode_filter=self.hard_mode_filter,
+        )
+        state.remaining = self.remaining
+        state.guesses = list(self.guesses)
+        state.guess_results = list(self.guess_results)
+        return state
+
+    @property
+    def num_remaining(self) -> int:
+        return len(self.remaining)
+
+    def get_remaining_words(self) -> List[str]:
+        return [self.answer_words[j] for j in self.remaining]
+
+    def get_history(self) -> History:
+        """Return the (guess, response) pairs so far"""
+        return tuple(
+            (self.guess_words[guess], result)
+            for guess, result in zip(self.guesses, self.guess_results)
+        )
+
+    def prune(self, last_guess: str, guess_result: List[int]) -> None:
+        """Only keep the answers which would have given this result for this guess"""
+        rval = array_to_integer(guess_result)
+        guess = self.guess_indexes[last_guess]
+        row = self.table[guess]
+        self.remaining = self.remaining[row[self.remaining] == rval]
+        self.guesses.append(guess)
+        self.guess_results.append(rval)
+
+    def get_candidate_guesses(self) -> np.ndarray:
+        """
+        We only guess words which could still be the answer
+        Return their rows in the table, in ascending order
+        NOTE: a word which could still be the answer always uses all the hints, so in practice hard mode doesn't remove any
+        candidates. The filter is still applied so the guarantee doesn't depend on how the candidates are picked
+        """
+        rows = self.answer_rows[self.remaining]
+        rows = rows[rows >= 0]
+        if self.hard_mode_filter is not None:
+            allowed = self.hard_mode_filter.get_allowed(self.guesses, self.guess_results)
+            rows = rows[allowed[rows]]
+        return rows
+
+    def score_candidate_guesses(self) -> PartitionScores:
+        """Score every candidate guess against the remaining answers in one pass"""
+        return score_guesses(self.table, self.remaining, self.get_candidate_guesses())
+
+    def pick_next_guess(self, scores: np.ndarray) -> str:
+        """
+        :param scores:  One score per candidate guess (see get_candidate_guesses). Lowest score wins
+        Ties go to the candidate which comes first
+        """
+        candidates = self.get_candidate_guesses()
+        return self.guess_words[candidates[int(np.argmin(scores))]]
+
+
+class GuessMemo:
+    """
+    Remembers the next guess for every history seen so far, for a single strategy and first word.
+    The solver is deterministic, so games which get the same responses go down the same path.
+    Together the histories form a trie of the solver's decision tree, and each node only needs to be scored once.
+    """
+
+    def __init__(self, next_guesses: Optional[Dict[History, str]] = None, max_size: int = -1):
+        """
+        :param max_size:    If set (not -1), only keep this many of the most recently used histories
+        """
+        self.next_guesses = OrderedDict(next_guesses if next_guesses is not None else {})  # type: OrderedDict[History, str]
+        self.max_size = max_size
+
+    def get(self, history: History) -> Optional[str]:
+        guess = self.next_guesses.get(history)
+        if guess is not None and self.max_size > -1:
+            self.next_guesses.move_to_end(history)
+        return guess
+
+    def put(self, history: History, guess: str) -> None:
+        self.next_guesses[history] = guess
+        if self.max_size > -1:
+            self.next_guesses.move_to_end(history)
+            if len(self.next_guesses) > self.max_size:
+                self.next_guesses.popitem(last=False)
+
+    def record_game(self, guesses: List[str], results: List[int]) -> None:
+        """Add every step of a finished game. results[i] is the response to guesses[i]"""
+        for i in range(1, len(guesses)):
+            self.put(tuple(zip(guesses[:i], results[:i])), guesses[i])
+
+    def __len__(self) -> int:
+        return len(self.next_guesses)
+
+    def save(self, path: str, meta: dict) -> None:
+        out = {
+            "meta": meta,
+            "next_guesses": {
+                ",".join(f"{guess}:{result}" for guess, result in history): guess
+                for history, guess in self.next_guesses.items()
+            },
+        }
+        with open(path, "w") as fp:
+            json.dump(out, fp)
+
+    @staticmethod
+    def load(path: str, meta: dict) -> "GuessMemo":
+        """Return an empty memo if the file was saved with different metadata"""
+        with open(path) as fp:
+            contents = json.load(fp)
+        if contents["meta"] != meta:
+            return GuessMemo()
+        next_guesses = {}
+        for key, guess in contents["next_guesses"].items():
+            history = []
+            for step in key.split(","):
+                word, result = step.split(":")
+                history.append((word, int(result)))
+            next_guesses[tuple(history)] = guess
+        return GuessMemo(next_guesses)
+
+
+class SolverSession:
+    def __init__(
+        self,
+        table: np.ndarray,
+        guess_words: List[str],
+        answer_words: List[str],
+        content_hash: Optional[str] = None,
+        hard_mode: bool = False,
+    ):
+        """
+        Everything which doesn't depend on the game being played is computed here, once
+        :param table: table[i, j] is the response for guess_words[i] when the answer is answer_words[j]
+        :param content_hash: hash of the table file, if known. Used to key anything cached on disk
+        :param hard_mode: Whether every game is played in hard mode
+        """
+        self.table = table
+        self.content_hash = content_hash
+        self.guess_words = guess_words
+        self.answer_words = answer_words
+        self.guess_indexes = get_guess_indexes(guess_words)
+        self.answer_rows = get_answer_rows(self.guess_indexes, answer_words)
+        self.hard_mode = hard_mode
+        self.hard_mode_filter = HardModeFilter(guess_words) if hard_mode else None
+
+    def new_game(self) -> SolverState:
+        """Return the state at the start of a game: every answer is possible"""
+        return SolverState(
+            self.table,
+            self.guess_words,
+            self.answer_words,
+            answer_rows=self.answer_rows,
+            guess_indexes=self.guess_indexes,
+            hard_mode_filter=self.hard_mode_filter,
+        )
+
+
+def get_guess_indexes(guess_words: List[str]) -> Dict[str, int]:
+    return {word: i for i, word in enumerate(guess_words)}
+
+
+def get_answer_rows(guess_indexes: Dict[str, int], answer_words: List[str]) -> np.ndarray:
+    """For each answer word, return its row in the table (or -1 if it is not a guess word)"""
+    return np.array([guess_indexes.get(word, -1) for word in answer_words], dtype=np.int64)
@@ -0,0 +1,111 @@
+"""
+A small self-describing container format for numpy arrays.
+
+The whole file is memory-mapped once when read, and every array is a read-only view into that mapping,
+so loading is effectively free no matter how big the arrays are.
+
+Layout:
+    - 8 bytes:  MAGIC
+    - 8 bytes:  length of the JSON header (little-endian unsigned integer)
+    - the JSON header, padded with spaces so that the first array starts on an ALIGNMENT boundary
+    - the raw bytes of each array, each starting on an ALIGNMENT boundary
+
+The header contains the dtype, shape and offset of each array as well as arbitrary metadata.
+It also contains a hash of the contents of all the arrays so that caches derived from the file can be keyed on it.
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Tuple
+
+import numpy as np
+
+MAGIC = b"WRDLTBL1"
+ALIGNMENT = 64
+
+
+def _align(n: int) -> int:
+    return ((n + ALIGNMENT - 1) // ALIGNMENT) * ALIGNMENT
+
+
+def compute_content_hash(arrays: Dict[str, np.ndarray]) -> str:
+    """Hash the names, dtypes, shapes and contents of the arrays (in name order)"""
+    h = hashlib.sha256()
+    for name in sorted(arrays.keys()):
+        arr = np.ascontiguousarray(arrays[name])
+        h.update(name.encode("utf-8"))
+        h.update(arr.dtype.str.encode("ascii"))
+        h.update(str(arr.shape).encode("ascii"))
+        h.update(arr.data.cast("B"))
+    return h.hexdigest()
+
+
+def write_table_file(path: str, arrays: Dict[str, np.ndarray], meta: dict) -> str:
+    """
+    Write the arrays into a single file at path
+    The file is written to a temporary path first so readers never see a half-written file
+    Return the content hash
+    """
+    content_hash = compute_content_hash(arrays)
+    names = sorted(arrays.keys())
+
+    # the header size depends on the offsets, which depend on the header size
+    # so leave enough room for the offsets and fill them in afterwards
+    header = {
+        "meta": dict(meta, content_hash=content_hash),
+        "arrays": {
+            name: {
+                "dtype": arrays[name].dtype.str,
+                "shape": list(arrays[name].shape),
+                "offset": 0,
+            }
+            for name in names
+        },
+    }
+    header_len = len(json.dumps(header).encode("utf-8")) + 32 * len(names)
+    offset = _align(len(MAGIC) + 8 + header_len)
+    for name in names:
+        header["arrays"][name]["offset"] = offset
+        offset = _align(offset + arrays[name].nbytes)
+
+    header_bytes = json.dumps(header).encode("utf-8")
+    assert len(header_bytes) <= header_len
+    header_bytes = header_bytes.ljust(header_len, b" ")
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as fp:
+        fp.write(MAGIC)
+        fp.write(len(header_bytes).to_bytes(8, "little"))
+        fp.write(header_bytes)
+        for name in names:
+            fp.seek(header["arrays"][name]["offset"])
+            fp.write(np.ascontiguousarray(arrays[name]).data.cast("B"))
+    os.replace(tmp_path, path)
+    return content_hash
+
+
+def read_table_file(path: str) -> Tuple[Dict[str, np.ndarray], dict]:
+    """
+    Memory-map the file at path read-only
+    Return a tuple of 2 items:
+        - arrays -> map from name to a read-only view of the array
+        - meta -> the metadata the file was written with. Includes the content_hash
+    """
+    mapping = np.memmap(path, dtype=np.uint8, mode="r")
+    if bytes(mapping[: len(MAGIC)]) != MAGIC:
+        raise Exception(f"{path} is not a table file")
+    header_start = len(MAGIC) + 8
+    header_len = int.from_bytes(bytes(mapping[len(MAGIC) : header_start]), "little")
+    header = json.loads(bytes(mapping[header_start : header_start + header_len]))
+
+    # a plain ndarray avoids the np.memmap subclass overhead on every slice
+    buf = np.asarray(mapping)
+    arrays = {}
+    for name, info in header["arrays"].items():
+        dtype = np.dtype(info["dtype"])
+        shape = tuple(info["shape"])
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        start = info["offset"]
+        arrays[name] = buf[start : start + nbytes].view(dtype).reshape(shape)
+    return arrays, header["meta"]
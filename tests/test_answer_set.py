@@ -0,0 +1,53 @@
+import numpy as np
+
+from answer_set import AnswerSet
+
+
+def test_from_ids():
+    ids = np.array([3, 0, 70, 9, 3])
+    answers = AnswerSet.from_ids(ids)
+    assert answers.to_array().tolist() == [0, 3, 9, 70]
+    assert len(answers) == 4
+    assert answers == AnswerSet.from_iterable([0, 3, 9, 70])
+    assert answers.first() == 0
+    assert 70 in answers
+    assert 71 not in answers
+    assert list(answers) == [0, 3, 9, 70]
+
+
+def test_empty():
+    answers = AnswerSet.from_ids(np.array([], dtype=np.int64))
+    assert not answers
+    assert len(answers) == 0
+    assert answers.to_array().size == 0
+    assert answers == AnswerSet()
+
+
+def test_full():
+    answers = AnswerSet.full(2315)
+    assert len(answers) == 2315
+    assert np.array_equal(answers.to_array(), np.arange(2315))
+
+
+def test_set_operations():
+    a = AnswerSet.from_iterable([1, 2, 3, 200])
+    b = AnswerSet.from_iterable([2, 3, 4])
+    assert (a & b).to_array().tolist() == [2, 3]
+    assert a.intersection(b) == a & b
+    assert (a | b).to_array().tolist() == [1, 2, 3, 4, 200]
+    a.update(b)
+    a.add(500)
+    assert a.to_array().tolist() == [1, 2, 3, 4, 200, 500]
+    assert AnswerSet.from_iterable([5, 9]).first() == 5
+
+
+def test_matches_python_sets():
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        ids = rng.choice(3000, size=rng.integers(1, 300), replace=False)
+        other = rng.choice(3000, size=200, replace=False)
+        answers = AnswerSet.from_ids(ids)
+        assert len(answers) == len(set(ids.tolist()))
+        assert (answers & AnswerSet.from_ids(other)).to_array().tolist() == sorted(set(ids.tolist()) & set(other.tolist()))
+        # usable as a dict key, e.g. in the transposition table
+        assert hash(answers) == hash(AnswerSet.from_iterable(ids.tolist()))
@@ -0,0 +1,59 @@
+import json
+
+from eval_results import (
+    get_recorded_answers,
+    make_eval_record,
+    open_eval_results,
+    read_eval_results,
+    summarize_eval_results,
+    write_eval_json,
+    write_eval_result,
+)
+
+RECORDS = [
+    make_eval_record("cigar", True, 3, ["serai", "cimar", "cigar"]),
+    make_eval_record("rebut", True, 4, ["serai", "reney", "recto", "rebut"]),
+    make_eval_record("sissy", False, 6, ["serai", "sissy"]),
+]
+
+
+def write_records(path: str, records: list, resume: bool = False) -> None:
+    with open_eval_results(path, resume=resume) as fp:
+        for record in records:
+            write_eval_result(fp, record)
+
+
+def test_resume_skips_half_written_line(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    write_records(path, RECORDS[:2])
+    with open(path, "a") as fp:
+        fp.write('{"answer": "sis')
+    assert get_recorded_answers(path) == set(["cigar", "rebut"])
+    write_records(path, RECORDS[2:], resume=True)
+    assert list(read_eval_results(path)) == RECORDS
+
+
+def test_write_eval_json(tmp_path):
+    results_path = str(tmp_path / "results.jsonl")
+    out_path = str(tmp_path / "results.json")
+    write_records(results_path, RECORDS)
+    info = {"first_word": "serai", "strategy": "worst_partition", "num_answers_tested": 3}
+    summary = write_eval_json(out_path, results_path, info)
+    with open(out_path) as fp:
+        out = json.load(fp)
+    per_word_results = out.pop("per_word_results")
+    assert out == info
+    assert per_word_results == {record["answer"]: {k: v for k, v in record.items() if k != "answer"} for record in RECORDS}
+
+    assert summary.num_puzzles == 3
+    assert summary.num_solved == 2
+    assert summary.mean_guesses == summarize_eval_results(results_path).mean_guesses == 13 / 3
+
+
+def test_write_eval_json_without_results(tmp_path):
+    results_path = str(tmp_path / "results.jsonl")
+    out_path = str(tmp_path / "results.json")
+    write_records(results_path, [])
+    write_eval_json(out_path, results_path, {"first_word": "serai"})
+    with open(out_path) as fp:
+        assert json.load(fp) == {"first_word": "serai", "per_word_results": {}}
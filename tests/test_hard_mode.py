@@ -0,0 +1,40 @@
+import random
+
+import numpy as np
+
+from hard_mode import HardModeFilter
+from parse_data import read_all_answers
+from play import RIGHT_PLACE, WRONG_PLACE, UNSAFE_eval_guess
+from possibilities_table import array_to_integer
+
+
+def uses_hints(word: str, guess: str, result: list) -> bool:
+    """The hard mode rule, one word at a time"""
+    for i, val in enumerate(result):
+        if val == RIGHT_PLACE and word[i] != guess[i]:
+            return False
+        if val == WRONG_PLACE and guess[i] not in word:
+            return False
+    return True
+
+
+def test_allowed_guesses_use_the_hints():
+    words = read_all_answers()[:500]
+    hard_mode_filter = HardModeFilter(words)
+    rng = random.Random(0)
+    for _ in range(20):
+        answer = rng.choice(words)
+        guesses = rng.sample(words, 2)
+        results = [UNSAFE_eval_guess(guess, answer) for guess in guesses]
+        allowed = hard_mode_filter.get_allowed(
+            [words.index(guess) for guess in guesses], [array_to_integer(result) for result in results]
+        )
+        expected = [all(uses_hints(word, guess, result) for guess, result in zip(guesses, results)) for word in words]
+        assert allowed.tolist() == expected
+        # the answer always uses all the hints
+        assert allowed[words.index(answer)]
+
+
+def test_no_guesses_allows_everything():
+    words = ["crane", "slate", "trace"]
+    assert np.all(HardModeFilter(words).get_allowed([], []))
@@ -0,0 +1,47 @@
+import numpy as np
+
+from partition_index import NUM_RESULTS, build_partition_index, load_partition_index
+from possibilities_table import PossibilitiesTable
+
+
+def get_table() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    # few distinct results, so most partitions have several answers
+    return rng.choice(np.array([0, 5, 80, 242], dtype=np.uint8), size=(30, 50))
+
+
+def check_index(index, table: np.ndarray) -> None:
+    for guess in range(table.shape[0]):
+        sizes = index.get_partition_sizes(guess)
+        assert sizes.shape == (NUM_RESULTS,)
+        assert np.array_equal(sizes, np.bincount(table[guess], minlength=NUM_RESULTS))
+        for result in range(NUM_RESULTS):
+            expected = np.flatnonzero(table[guess] == result)
+            assert np.array_equal(index.get_answers(guess, result), expected)
+            assert index.get_answer_set(guess, result).to_array().tolist() == expected.tolist()
+
+
+def test_index_matches_table():
+    table = get_table()
+    # a block size which doesn't divide the number of guesses
+    check_index(build_partition_index(table, "hash", block_size=7), table)
+
+
+def test_load_builds_and_saves(tmp_path):
+    table = get_table()
+    possibilities = PossibilitiesTable(table, [], [], content_hash="hash")
+    path = str(tmp_path / "index.table")
+    index = load_partition_index(possibilities, path)
+    assert index.table_hash == "hash"
+    check_index(index, table)
+    # the second time it is read back from the file
+    check_index(load_partition_index(possibilities, path), table)
+
+
+def test_load_rebuilds_stale_index(tmp_path):
+    path = str(tmp_path / "index.table")
+    load_partition_index(PossibilitiesTable(get_table(), [], [], content_hash="old"), path)
+    table = get_table()[::-1]
+    index = load_partition_index(PossibilitiesTable(table, [], [], content_hash="new"), path)
+    assert index.table_hash == "new"
+    check_index(index, table)
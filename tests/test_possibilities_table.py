@@ -0,0 +1,102 @@
+import os
+import random
+
+import numpy as np
+
+from parse_data import read_all_answers, read_parsed_words
+from play import UNSAFE_eval_guess
+from possibilities_table import (
+    array_to_integer,
+    build_possibilities_table_parallel,
+    compute_possibilities_block,
+    fill_possibilities_table,
+    get_words_digest,
+    load_table_file,
+    words_to_letter_array,
+    write_build_manifest,
+)
+from response_codec import ALL_LETTERS_CORRECT
+
+# words with repeated letters, which are where the response is easiest to get wrong
+REPEATED_LETTER_WORDS = ["speed", "abbey", "eerie", "geese", "llama", "mamma", "sassy", "crane", "eater", "tatty"]
+
+
+def get_sample_words(n: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    return rng.sample(read_parsed_words(), n) + REPEATED_LETTER_WORDS
+
+
+def test_block_matches_eval_guess():
+    guess_words = get_sample_words(200)
+    answer_words = get_sample_words(100, seed=1)
+    block = compute_possibilities_block(words_to_letter_array(guess_words), words_to_letter_array(answer_words))
+    assert block.shape == (len(guess_words), len(answer_words))
+    assert block.dtype == np.uint8
+    for i, guess in enumerate(guess_words):
+        for j, answer in enumerate(answer_words):
+            assert block[i, j] == array_to_integer(UNSAFE_eval_guess(guess, answer)), (guess, answer)
+
+
+def test_fill_in_blocks_matches_single_block():
+    guess_words = get_sample_words(50)
+    answer_words = read_all_answers()[:300]
+    guess_letters = words_to_letter_array(guess_words)
+    answer_letters = words_to_letter_array(answer_words)
+    table = np.empty((len(guess_words), len(answer_words)), dtype="uint8")
+    # a block size which doesn't divide the number of guesses, so the last block is partial
+    fill_possibilities_table(table, guess_letters, answer_letters, block_size=7)
+    assert np.array_equal(table, compute_possibilities_block(guess_letters, answer_letters))
+
+
+def test_guessing_the_answer():
+    words = get_sample_words(30)
+    block = compute_possibilities_block(words_to_letter_array(words), words_to_letter_array(words))
+    assert np.all(np.diag(block) == ALL_LETTERS_CORRECT)
+
+
+def test_parallel_build(tmp_path):
+    words = read_all_answers()[:40]
+    out_path = str(tmp_path / "table.table")
+    build_possibilities_table_parallel(out_path, words, words, 2, block_size=8)
+    possibilities = load_table_file(out_path)
+    assert possibilities.guess_words == words
+    assert possibilities.answer_words == words
+    letters = words_to_letter_array(words)
+    assert np.array_equal(possibilities.table, compute_possibilities_block(letters, letters))
+    # the scratch files are cleaned up
+    assert os.listdir(tmp_path) == ["table.table"]
+
+
+def write_partial_build(out_path: str, words: list, block_size: int, finished_blocks: set, words_digest: str) -> None:
+    """Leave behind what an interrupted build would have: the blocks in finished_blocks are filled with 255"""
+    table = np.lib.format.open_memmap(out_path + ".partial", mode="w+", dtype="uint8", shape=(len(words), len(words)))
+    for block_i in finished_blocks:
+        table[block_i * block_size : (block_i + 1) * block_size] = 255
+    table.flush()
+    del table
+    build_info = {"shape": [len(words), len(words)], "block_size": block_size, "words_digest": words_digest}
+    write_build_manifest(out_path + ".manifest.json", build_info, finished_blocks)
+
+
+def test_parallel_build_resumes(tmp_path):
+    words = read_all_answers()[:40]
+    out_path = str(tmp_path / "table.table")
+    write_partial_build(out_path, words, 8, set([0, 2]), get_words_digest(words, words))
+    build_possibilities_table_parallel(out_path, words, words, 2, block_size=8)
+    table = load_table_file(out_path).table
+    # the finished blocks were kept, and only the others were computed
+    assert np.all(table[0:8] == 255)
+    assert np.all(table[16:24] == 255)
+    letters = words_to_letter_array(words)
+    expected = compute_possibilities_block(letters, letters)
+    assert np.array_equal(table[8:16], expected[8:16])
+    assert np.array_equal(table[24:], expected[24:])
+
+
+def test_parallel_build_ignores_stale_manifest(tmp_path):
+    words = read_all_answers()[:40]
+    out_path = str(tmp_path / "table.table")
+    write_partial_build(out_path, words, 8, set([0, 2]), "some other words")
+    build_possibilities_table_parallel(out_path, words, words, 2, block_size=8)
+    letters = words_to_letter_array(words)
+    assert np.array_equal(load_table_file(out_path).table, compute_possibilities_block(letters, letters))
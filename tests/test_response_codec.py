@@ -0,0 +1,74 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from play import LETTER_ABSENT, RIGHT_PLACE, WRONG_PLACE, UNSAFE_eval_guess
+from possibilities_table import array_to_integer
+from response_codec import (
+    ALL_LETTERS_CORRECT,
+    GREEN_MASKS,
+    GREY_MASKS,
+    NUM_RESPONSES,
+    YELLOW_MASKS,
+    decode_response,
+    decode_responses,
+    encode_response,
+    encode_responses,
+    response_from_string,
+    response_to_string,
+    responses_to_strings,
+)
+
+
+def test_every_response_round_trips():
+    for code in range(NUM_RESPONSES):
+        digits = decode_response(code)
+        assert encode_response(digits) == code
+        assert response_from_string(response_to_string(code)) == code
+    # every response has its own code
+    codes = [encode_response(digits) for digits in itertools.product(range(3), repeat=5)]
+    assert sorted(codes) == list(range(NUM_RESPONSES))
+
+
+def test_encoding():
+    assert encode_response([RIGHT_PLACE] * 5) == ALL_LETTERS_CORRECT
+    assert response_to_string(ALL_LETTERS_CORRECT) == "GGGGG"
+    # the first letter is the least significant digit
+    assert encode_response([WRONG_PLACE, LETTER_ABSENT, LETTER_ABSENT, LETTER_ABSENT, LETTER_ABSENT]) == WRONG_PLACE
+    assert response_to_string(response_from_string("YBBGB")) == "YBBGB"
+    digits = UNSAFE_eval_guess("crane", "trace")
+    assert encode_response(digits) == array_to_integer(digits)
+
+
+def test_decoded_list_is_a_copy():
+    digits = decode_response(ALL_LETTERS_CORRECT)
+    digits[0] = LETTER_ABSENT
+    assert decode_response(ALL_LETTERS_CORRECT) == [RIGHT_PLACE] * 5
+
+
+def test_invalid_responses():
+    with pytest.raises(ValueError):
+        encode_response([3, 0, 0, 0, 0])
+    with pytest.raises(ValueError):
+        encode_response([0, 0, 0, 0])
+    with pytest.raises(ValueError):
+        response_from_string("GGGGX")
+    with pytest.raises(ValueError):
+        encode_responses(np.array([[0, 0, 0, 0, 3]]))
+
+
+def test_batch_functions():
+    codes = np.arange(NUM_RESPONSES).reshape(3, 81)
+    digits = decode_responses(codes)
+    assert digits.shape == (3, 81, 5)
+    assert np.array_equal(encode_responses(digits), codes)
+    strings = responses_to_strings(codes)
+    assert strings[2, 80] == response_to_string(int(codes[2, 80]))
+
+
+def test_position_masks():
+    for code in range(NUM_RESPONSES):
+        digits = decode_response(code)
+        for masks, val in [(GREEN_MASKS, RIGHT_PLACE), (YELLOW_MASKS, WRONG_PLACE), (GREY_MASKS, LETTER_ABSENT)]:
+            assert masks[code] == sum(1 << i for i, v in enumerate(digits) if v == val)
@@ -0,0 +1,43 @@
+from solver_state import GuessMemo
+
+
+def test_record_game():
+    memo = GuessMemo()
+    memo.record_game(["serai", "cimar", "cigar"], [10, 200, 242])
+    assert len(memo) == 2
+    assert memo.get((("serai", 10),)) == "cimar"
+    assert memo.get((("serai", 10), ("cimar", 200))) == "cigar"
+    assert memo.get((("serai", 11),)) is None
+
+
+def test_memo_round_trip(tmp_path):
+    path = str(tmp_path / "memo.json")
+    memo = GuessMemo()
+    memo.record_game(["serai", "cimar", "cigar"], [10, 200, 242])
+    memo.record_game(["serai", "touch", "dough"], [0, 30, 242])
+    meta = {"strategy": "worst_partition", "first_word": "serai", "content_hash": "abc"}
+    memo.save(path, meta)
+    loaded = GuessMemo.load(path, meta)
+    assert loaded.next_guesses == memo.next_guesses
+    # a memo saved for a different table is not used
+    assert len(GuessMemo.load(path, dict(meta, content_hash="def"))) == 0
+
+
+def test_bounded_memo_drops_least_recently_used():
+    memo = GuessMemo(max_size=2)
+    memo.put((("a", 1),), "x")
+    memo.put((("b", 1),), "y")
+    # using a history makes it the most recent
+    assert memo.get((("a", 1),)) == "x"
+    memo.put((("c", 1),), "z")
+    assert len(memo) == 2
+    assert memo.get((("b", 1),)) is None
+    assert memo.get((("a", 1),)) == "x"
+    assert memo.get((("c", 1),)) == "z"
+
+
+def test_unbounded_memo():
+    memo = GuessMemo()
+    for i in range(1000):
+        memo.put((("w", i),), "g")
+    assert len(memo) == 1000
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from possibilities_table import load_table_file, save_table_file
+from table_file import ALIGNMENT, compute_content_hash, read_table_file, write_table_file
+
+
+def get_arrays() -> dict:
+    rng = np.random.default_rng(0)
+    return {
+        "table": rng.integers(0, 243, size=(37, 11), dtype=np.uint8),
+        "ids": np.arange(13, dtype=np.int32),
+        "words": np.array(["crane", "slate", "trace"], dtype="S5"),
+    }
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "arrays.table")
+    arrays = get_arrays()
+    content_hash = write_table_file(path, arrays, meta={"name": "test"})
+    read_arrays, meta = read_table_file(path)
+    assert sorted(read_arrays.keys()) == sorted(arrays.keys())
+    for name, arr in arrays.items():
+        assert read_arrays[name].dtype == arr.dtype
+        assert np.array_equal(read_arrays[name], arr)
+    assert meta == {"name": "test", "content_hash": content_hash}
+
+
+def test_arrays_are_aligned_and_read_only(tmp_path):
+    path = str(tmp_path / "arrays.table")
+    write_table_file(path, get_arrays(), meta={})
+    read_arrays, _ = read_table_file(path)
+    for arr in read_arrays.values():
+        assert arr.ctypes.data % ALIGNMENT == 0
+        with pytest.raises(ValueError):
+            arr[0] = 0
+
+
+def test_content_hash():
+    arrays = get_arrays()
+    assert compute_content_hash(arrays) == compute_content_hash(get_arrays())
+    # a non-contiguous view hashes the same as a copy of it
+    assert compute_content_hash({"table": arrays["table"][:, ::2]}) == compute_content_hash(
+        {"table": np.ascontiguousarray(arrays["table"][:, ::2])}
+    )
+    arrays["table"][3, 4] += 1
+    assert compute_content_hash(arrays) != compute_content_hash(get_arrays())
+
+
+def test_not_a_table_file(tmp_path):
+    path = tmp_path / "arrays.npy"
+    np.save(path, np.zeros(10))
+    with pytest.raises(Exception):
+        read_table_file(str(path))
+
+
+def test_possibilities_round_trip(tmp_path):
+    path = str(tmp_path / "possibilities.table")
+    guess_words = ["crane", "slate", "trace", "adieu"]
+    answer_words = ["crane", "trace"]
+    table = np.arange(8, dtype=np.uint8).reshape(4, 2)
+    content_hash = save_table_file(path, table, guess_words, answer_words)
+    possibilities = load_table_file(path)
+    assert np.array_equal(possibilities.table, table)
+    assert possibilities.guess_words == guess_words
+    assert possibilities.answer_words == answer_words
+    assert possibilities.content_hash == content_hash
@@ -0,0 +1,58 @@
+from answer_set import AnswerSet
+from transposition_table import TranspositionTable
+
+ANSWERS = AnswerSet.from_iterable([1, 5, 9])
+SUBTREE = {1: {}}
+
+
+def solved(size: int) -> tuple:
+    return (SUBTREE, ANSWERS, size, 100, True, False)
+
+
+def unsolved(size_cutoff: int) -> tuple:
+    return (None, AnswerSet(), size_cutoff, 100, False, False)
+
+
+def test_solved_subtree():
+    table = TranspositionTable()
+    assert table.lookup(ANSWERS, 3, -1) is None
+    table.store(ANSWERS, 3, -1, solved(7))
+    assert table.lookup(ANSWERS, 3, -1) == (SUBTREE, ANSWERS, 7, 0, True, False)
+    assert table.lookup(ANSWERS, 3, 8) == (SUBTREE, ANSWERS, 7, 0, True, False)
+    # over the budget
+    assert table.lookup(ANSWERS, 3, 7) == (None, AnswerSet(), 7, 0, False, False)
+    # a different depth is a different entry
+    assert table.lookup(ANSWERS, 4, -1) is None
+    assert table.num_hits == 3
+    assert table.num_misses == 2
+
+
+def test_failed_search_depends_on_budget():
+    table = TranspositionTable()
+    table.store(ANSWERS, 3, 10, unsolved(10))
+    # no more budget than before
+    assert table.lookup(ANSWERS, 3, 10) == (None, AnswerSet(), 10, 0, False, False)
+    assert table.lookup(ANSWERS, 3, 6) == (None, AnswerSet(), 6, 0, False, False)
+    # more budget (or none) could still succeed
+    assert table.lookup(ANSWERS, 3, 11) is None
+    assert table.lookup(ANSWERS, 3, -1) is None
+
+
+def test_dead_end():
+    table = TranspositionTable()
+    table.store(ANSWERS, 5, 4, (None, AnswerSet(), 4, 1, False, True))
+    assert table.lookup(ANSWERS, 5, -1) == (None, AnswerSet(), -1, 0, False, True)
+
+
+def test_drops_least_recently_used():
+    table = TranspositionTable(max_size=2)
+    a = AnswerSet.from_iterable([1])
+    b = AnswerSet.from_iterable([2])
+    c = AnswerSet.from_iterable([3])
+    table.store(a, 2, -1, solved(2))
+    table.store(b, 2, -1, solved(2))
+    assert table.lookup(a, 2, -1) is not None
+    table.store(c, 2, -1, solved(2))
+    assert len(table) == 2
+    assert table.lookup(b, 2, -1) is None
+    assert table.lookup(a, 2, -1) is not None
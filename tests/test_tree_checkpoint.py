@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+import tree_checkpoint
+from tree_checkpoint import TreeCheckpoint, get_tree_file_hash
+
+SEARCH = dict(dictionary="answers", first_word="crane", max_depth=6, find_optimal=False, hard_mode=False, table_hash="abc123")
+
+
+@pytest.fixture(autouse=True)
+def checkpoint_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tree_checkpoint, "CHECKPOINT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_round_trip():
+    checkpoint = TreeCheckpoint(**SEARCH)
+    assert not checkpoint.load()
+    checkpoint.add(10, {5: {}}, 3)
+    checkpoint.add(200, {7: {1: {8: {}}}}, 9)
+
+    resumed = TreeCheckpoint(**SEARCH)
+    assert resumed.load()
+    assert len(resumed) == 2
+    assert resumed.get(10) == ({5: {}}, 3)
+    assert resumed.get(200) == ({7: {1: {8: {}}}}, 9)
+    assert resumed.get(11) is None
+
+    resumed.remove()
+    assert not TreeCheckpoint(**SEARCH).load()
+
+
+def test_save_leaves_no_temporary_file(checkpoint_dir):
+    checkpoint = TreeCheckpoint(**SEARCH)
+    checkpoint.add(10, {5: {}}, 3)
+    assert [p.name for p in checkpoint_dir.iterdir()] == [os.path.basename(checkpoint.path)]
+
+
+@pytest.mark.parametrize(
+    "changes",
+    [
+        dict(dictionary="asymmetric"),
+        dict(first_word="slate"),
+        dict(max_depth=5),
+        dict(find_optimal=True),
+        dict(hard_mode=True),
+        dict(table_hash="def456"),
+    ],
+)
+def test_keyed_by_search(changes):
+    TreeCheckpoint(**SEARCH).add(10, {5: {}}, 3)
+    other = TreeCheckpoint(**dict(SEARCH, **changes))
+    assert other.path != TreeCheckpoint(**SEARCH).path
+    assert not other.load()
+
+
+def test_keyed_by_tree_file(tmp_path):
+    tree_path = tmp_path / "tree.json"
+    tree_path.write_text('{"5": {}}')
+    tree_hash = get_tree_file_hash(str(tree_path))
+    TreeCheckpoint(**SEARCH, tree_hash=tree_hash).add(10, {5: {}}, 3)
+    assert TreeCheckpoint(**SEARCH, tree_hash=tree_hash).load()
+    # the same search guided by another tree (or none) doesn't use it
+    tree_path.write_text('{"6": {}}')
+    assert not TreeCheckpoint(**SEARCH, tree_hash=get_tree_file_hash(str(tree_path))).load()
+    assert not TreeCheckpoint(**SEARCH).load()
@@ -0,0 +1,74 @@
+"""
+A transposition table for the decision tree search.
+
+Different paths through the tree often leave the same answers possible with the same number of guesses left.
+Rather than searching for a subtree from scratch every time, we remember what the search found for each
+(answer set, depth) the first time around:
+    - the best subtree and its size, or
+    - that no subtree exists (or none smaller than the size cutoff at the time)
+A solved size is also a bound: if it is over the budget of a later search, that search can't succeed either.
+
+The table only holds the most recently used entries, so memory stays bounded on long searches.
+"""
+
+from collections import OrderedDict
+from typing import Optional
+
+from answer_set import AnswerSet
+
+# maximum number of entries to keep. Each one is roughly the size of its key (up to a few hundred bytes)
+TRANSPOSITION_TABLE_SIZE = 250_000
+
+
+class TranspositionTable:
+    def __init__(self, max_size: int = TRANSPOSITION_TABLE_SIZE):
+        self.max_size = max_size
+        # (answer set bits, depth) -> (partition result, size cutoff it was found with)
+        self.entries = OrderedDict()  # type: OrderedDict[tuple, tuple]
+        self.num_hits = 0
+        self.num_misses = 0
+
+    def lookup(self, possible_answers: AnswerSet, depth: int, size_cutoff: int) -> Optional[tuple]:
+        """
+        Return the result of an earlier search for these answers at this depth, if it also answers a search with this size cutoff.
+        The result has the same layout as solve_partition's, with no states opened
+        """
+        key = (possible_answers.bits, depth)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.num_misses += 1
+            return None
+        (subtree, _, subtree_size, _, is_subtree_solved, is_dead_end), prev_size_cutoff = entry
+
+        result = None  # type: Optional[tuple]
+        if is_dead_end:
+            # doesn't depend on the budget
+            result = (None, AnswerSet(), size_cutoff, 0, False, True)
+        elif is_subtree_solved:
+            if size_cutoff == -1 or subtree_size < size_cutoff:
+                # a solved subtree reaches every possible answer
+                result = (subtree, possible_answers, subtree_size, 0, True, False)
+            else:
+                # the best subtree is over budget
+                result = (None, AnswerSet(), size_cutoff, 0, False, False)
+        elif prev_size_cutoff == -1 or (size_cutoff > -1 and size_cutoff <= prev_size_cutoff):
+            # we failed before with at least as much budget
+            result = (None, AnswerSet(), size_cutoff, 0, False, False)
+
+        if result is None:
+            # failed before with a smaller budget, which doesn't tell us anything
+            self.num_misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.num_hits += 1
+        return result
+
+    def store(self, possible_answers: AnswerSet, depth: int, size_cutoff: int, result: tuple) -> None:
+        key = (possible_answers.bits, depth)
+        self.entries[key] = (result, size_cutoff)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.entries)
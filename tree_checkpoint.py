@@ -0,0 +1,111 @@
+"""
+Checkpoints for long decision tree searches.
+
+The partitions for the results of the first word are solved independently of each other, so we save each one
+(its subtree and size) as soon as it is solved. A search that gets killed can be resumed (decision_tree.py --resume)
+and only has to solve the partitions that are left.
+
+A checkpoint is only valid for the search that wrote it, so the files are keyed by everything that changes the result:
+the dictionary, the table, the first word, the max depth, whether we're looking for the optimal tree or playing hard mode,
+and the tree (if any) we were given to guide the search.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+from typing import Optional, Tuple
+
+CHECKPOINT_DIR = "cache/tree-checkpoints"
+
+
+def get_checkpoint_path(
+    dictionary: str, first_word: str, max_depth: int, find_optimal: bool, hard_mode: bool, table_hash: str
+) -> str:
+    mode = "-hard-mode" if hard_mode else ""
+    search = "optimal" if find_optimal else "first"
+    return os.path.join(
+        CHECKPOINT_DIR,
+        f"checkpoint-{dictionary}-{first_word}{mode}-m{max_depth}-{search}-{table_hash[:16]}.pickle",
+    )
+
+
+def get_checkpoint_meta(
+    dictionary: str,
+    first_word: str,
+    max_depth: int,
+    find_optimal: bool,
+    hard_mode: bool,
+    table_hash: str,
+    tree_hash: Optional[str] = None,
+) -> dict:
+    return {
+        "dictionary": dictionary,
+        "table_hash": table_hash,
+        "first_word": first_word,
+        "max_depth": max_depth,
+        "find_optimal": find_optimal,
+        "hard_mode": hard_mode,
+        "tree_hash": tree_hash,
+    }
+
+
+def get_tree_file_hash(path: str) -> str:
+    """Hash the contents of a tree file, so that a checkpoint is only reused with the same guiding tree"""
+    with open(path, "rb") as fp:
+        return hashlib.sha256(fp.read()).hexdigest()
+
+
+class TreeCheckpoint:
+    def __init__(
+        self,
+        dictionary: str,
+        first_word: str,
+        max_depth: int,
+        find_optimal: bool,
+        hard_mode: bool,
+        table_hash: str,
+        tree_hash: Optional[str] = None,
+    ):
+        """
+        :param tree_hash:   Hash of the tree file given to guide the search (see get_tree_file_hash), if any
+        """
+        self.path = get_checkpoint_path(dictionary, first_word, max_depth, find_optimal, hard_mode, table_hash)
+        self.meta = get_checkpoint_meta(dictionary, first_word, max_depth, find_optimal, hard_mode, table_hash, tree_hash)
+        # result of the first word -> (subtree, subtree size)
+        self.partitions = {}  # type: dict[int, Tuple[dict, int]]
+
+    def get(self, guess_result: int) -> Optional[Tuple[dict, int]]:
+        return self.partitions.get(guess_result)
+
+    def add(self, guess_result: int, subtree: dict, subtree_size: int) -> None:
+        """Record a solved partition, and save the checkpoint right away"""
+        self.partitions[guess_result] = (subtree, subtree_size)
+        self.save()
+
+    def save(self) -> None:
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        # write to a temporary file first, so that killing the process never leaves a half-written checkpoint behind
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as fp:
+            pickle.dump({"meta": self.meta, "partitions": self.partitions}, fp)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> bool:
+        """Load the partitions saved by a previous run of the same search. Return False if there aren't any"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, "rb") as fp:
+            contents = pickle.load(fp)
+        if contents["meta"] != self.meta:
+            logging.warning("Checkpoint %s was saved by a different search. Not using it", self.path)
+            return False
+        self.partitions = contents["partitions"]
+        return True
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __len__(self) -> int:
+        return len(self.partitions)
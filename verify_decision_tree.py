@@ -4,7 +4,6 @@ Verifies that all generated decision trees are valid
 
 import json
 import logging
-import pickle
 from typing import Dict
 
 import coloredlogs
@@ -13,7 +12,7 @@ import pandas as pd
 
 from parse_data import read_all_answers
 from play import eval_guess
-from possibilities_table import array_to_integer, guess_response_to_string
+from possibilities_table import array_to_integer, guess_response_to_string, load_possibilities
 
 
 def find_answer_in_tree(
@@ -41,6 +40,7 @@ def find_answer_in_tree(
     logging.info("depth %d, guessing %s", depth, guess_word)
     guesses.append(guess_word)
 
+    # evaluate each guess rather than looking it up in the possibilities table, so that a bad table can't hide a bad tree
     rv = eval_guess(guess_word, answer)
     rvi = array_to_integer(rv)
     rvs = guess_response_to_string(rvi)
@@ -77,7 +77,9 @@ def load_tree(path: str) -> dict:
 def check_file(path: str, dictionary: str) -> tuple[dict, Dict[str, int]]:
     tree = load_tree(path)
     root_word = path.split("/")[-1].split(".")[0]
-    guess_words, answer_words = get_words_for_dictionary(dictionary)
+    possibilities = load_possibilities(dictionary)
+    guess_words = possibilities.guess_words
+    answer_words = possibilities.answer_words
 
     print(f"Verifying tree {path} rooted at {root_word}...")
 
@@ -146,21 +148,9 @@ def get_dictionary_from_filename(path: str):
 
 
 def get_words_for_dictionary(dictionary: str) -> tuple[list[str], list[str]]:
-    if dictionary == "answers":
-        guess_words = read_all_answers()
-        answer_words = read_all_answers()
-        return guess_words, answer_words
-    elif dictionary == "asymmetric":
-        # actually need to use another set of files
-        with open("./data-parsed/possibilities-keys-asymmetric.pickle", "rb") as fp:
-            guess_words, answer_words = pickle.load(fp)
-
-        # now verify that they are loaded correctly
-        for i in range(len(answer_words)):
-            assert answer_words[i] == guess_words[i]
-        return guess_words, answer_words
-    else:
-        raise Exception(dictionary)
+    # the words are stored in the table file itself
+    possibilities = load_possibilities(dictionary)
+    return possibilities.guess_words, possibilities.answer_words
 
 
 def print_tree_stats(tree: dict, depths: Dict[str, int], dictionary: str):
@@ -195,7 +185,9 @@ def convert_to_leaderboard_format(in_path: str, dictionary: str):
     Each line must be a comma-separated list of guesses for that answer"""
     answers = read_all_answers()
     tree = load_tree(path)
-    guess_words, answer_words = get_words_for_dictionary(dictionary)
+    possibilities = load_possibilities(dictionary)
+    guess_words = possibilities.guess_words
+    answer_words = possibilities.answer_words
     root_word = in_path.split("/")[-1].split(".")[0]
 
     rows = []